@@ -1,7 +1,37 @@
 import re
-import ebooklib
-from ebooklib import epub
-from bs4 import BeautifulSoup
+from bs4 import BeautifulSoup, UnicodeDammit
+from html_block_extract import RUBY_AND_SCRIPT_TAGS, lxml_compatible, lxml_block_texts, parse_document, resolve_backend
+
+# 只有读取 EPUB 文件时才需要 ebooklib，块文本提取部分可单独导入使用
+try:
+    import ebooklib
+    from ebooklib import epub
+except ImportError:
+    ebooklib = None
+
+BLOCK_TAGS = ('p', 'div', 'h1', 'h2', 'h3', 'h4', 'h5', 'h6', 'li')
+PARSER_BACKEND = "auto"
+
+def block_texts_bs4(content):
+    """BeautifulSoup 解析路径（未安装 lxml 时的后备方案）：按文档顺序返回块级元素的 (标签名, 文本)"""
+    soup = BeautifulSoup(content, 'html.parser')
+    return [(element.name, element.get_text()) for element in soup.find_all(list(BLOCK_TAGS))]
+
+def block_texts_lxml(markup):
+    """lxml（libxml2）解析路径：解析后只遍历一次文档树；只用于 lxml_compatible() 通过的文档，结果与 BeautifulSoup 路径一致"""
+    root = parse_document(markup)
+    return lxml_block_texts(root, BLOCK_TAGS, RUBY_AND_SCRIPT_TAGS)
+
+def block_texts(content):
+    """返回章节文档中所有块级元素（段落/标题/列表等）的 (标签名, 文本)。
+    默认优先使用 lxml，未安装时或 lxml 与 html.parser 的解析树可能不同（省略结束标签、块元素嵌在段落中等）时
+    使用 BeautifulSoup，两条路径的结果相同"""
+    if resolve_backend(PARSER_BACKEND) == "lxml":
+        # 与 BeautifulSoup 使用相同的编码检测结果
+        markup = UnicodeDammit(content, is_html=True).unicode_markup
+        if markup is not None and lxml_compatible(markup):
+            return block_texts_lxml(markup)
+    return block_texts_bs4(content)
 
 def epub_to_txt(epub_path, txt_path):
     book = epub.read_epub(epub_path)
@@ -9,16 +39,13 @@ def epub_to_txt(epub_path, txt_path):
     
     for item in book.get_items():
         if item.get_type() == ebooklib.ITEM_DOCUMENT:
-            soup = BeautifulSoup(item.get_content(), 'html.parser')
-            
             # 处理所有块级元素（段落/标题/列表等）
-            for element in soup.find_all(['p', 'div', 'h1', 'h2', 'h3', 'h4', 'h5', 'h6', 'li']):
+            for name, text in block_texts(item.get_content()):
                 # 关键修复1：保留空行结构
-                if element.name in ['div', 'section']:
+                if name in ['div', 'section']:
                     output_lines.append('')
                 
                 # 关键修复2：合并段落内换行
-                text = element.get_text()
                 text = re.sub(r'(?<!\n)\n(?!\n)', ' ', text)  # 替换孤立换行符为空格
                 text = re.sub(r'\s+', ' ', text).strip()      # 压缩连续空格
                 
@@ -31,4 +58,8 @@ def epub_to_txt(epub_path, txt_path):
         f.write('\n'.join(output_lines))
 
 # 使用示例
-epub_to_txt('input.epub', 'output.txt')
+if __name__ == "__main__":
+    if ebooklib is None:
+        print("\n错误：未安装 ebooklib，请执行 pip install ebooklib")
+    else:
+        epub_to_txt('input.epub', 'output.txt')
@@ -1,42 +1,290 @@
 import os
 import re
+import html
+import json
+import hashlib
+import argparse
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
 from bs4 import BeautifulSoup
 from tqdm import tqdm
 import glob
+from segment_pack import PACK_SUFFIX, SegmentPackWriter, SegmentPackReader
+from html_block_extract import (RUBY_AND_SCRIPT_TAGS, IGNORED_MARKUP_PATTERN, lxml_html, lxml_compatible,
+                                lxml_block_texts, parse_document, resolve_backend)
+
+HEAD_CHUNK_SIZE = 8192
+IN_FLIGHT_PER_WORKER = 4
+MERGE_CACHE_DIR = ".merge_cache"
+MERGE_MANIFEST_NAME = "manifest.json"
+HASH_CHUNK_SIZE = 1 << 20
+PARSER_BACKEND = "auto"
+
+# 第一遍只读取文档头部，用正则找 <meta name="filename">；注释、脚本和样式中的内容不算
+HEAD_END_PATTERN = re.compile(r'</head\s*>|<body[\s>]', re.I)
+META_TAG_PATTERN = re.compile(r'<meta\b((?:[^>"\']|"[^"]*"|\'[^\']*\')*)>', re.I)
+ATTRIBUTE_PATTERN = re.compile(r'([^\s"\'>/=]+)(?:\s*=\s*(?:"([^"]*)"|\'([^\']*)\'|([^\s>]+)))?')
+
+def pack_html_folder(folder_path):
+    """把文件夹中的所有 .html 文件按文件名顺序写入同名 .segpack 打包文件，返回打包的文件数。
+    条目按文本模式读取后以 UTF-8 保存，合并结果与直接合并该文件夹时一致"""
+    html_files = sorted(glob.glob(os.path.join(folder_path, "*.html")))
+    if not html_files:
+        return 0
+    writer = SegmentPackWriter(folder_path + PACK_SUFFIX)
+    try:
+        for html_file in html_files:
+            with open(html_file, 'r', encoding='utf-8') as f:
+                writer.add(f.read().encode('utf-8'), os.path.basename(html_file))
+    except BaseException:
+        writer.abort()
+        raise
+    writer.close(metadata={"source": os.path.basename(folder_path)})
+    return len(html_files)
 
 def get_all_folders():
-    """获取当前目录下所有文件夹"""
-    return [f for f in os.listdir('.') if os.path.isdir(f)]
+    """获取当前目录下所有文件夹（不含合并缓存目录）"""
+    return [f for f in os.listdir('.') if os.path.isdir(f) and f != MERGE_CACHE_DIR]
 
-def process_folder(folder_path):
-    """处理单个文件夹中的所有HTML文件"""
+def pack_has_html(pack_path):
+    """打包文件中是否有 .html 条目；分段工具 --format pack 生成的纯文本段落包不是合并的输入"""
+    try:
+        with SegmentPackReader(pack_path) as reader:
+            return any(entry['name'].endswith(".html") for entry in reader.entries)
+    except (OSError, ValueError):
+        # 损坏的打包文件仍交给后续处理报告错误
+        return True
+
+def get_all_packs():
+    """获取当前目录下所有含HTML条目的 .segpack 打包文件"""
+    return [pack for pack in sorted(glob.glob(f"*{PACK_SUFFIX}")) if pack_has_html(pack)]
+
+def file_fingerprint(path):
+    """文件指纹：大小和修改时间，只需一次 stat 调用"""
+    stat = os.stat(path)
+    return {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns}
+
+def file_sha256(path):
+    """分块计算文件的 SHA-256"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK_SIZE), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def find_html_sources(source_path):
+    """列出要合并的HTML来源：(显示名, 打包文件路径或 None, 条目名或文件路径, 指纹)。
+    source_path 为文件夹时包括其中的 .html 文件和各打包文件里的 .html 条目；为打包文件时包括其中的 .html 条目。
+    普通文件的指纹为大小和修改时间，打包条目的指纹为索引中记录的内容哈希"""
+    if os.path.isdir(source_path):
+        sources = [(html_file, None, html_file, file_fingerprint(html_file))
+                   for html_file in glob.glob(os.path.join(source_path, "*.html"))]
+        pack_paths = glob.glob(os.path.join(source_path, f"*{PACK_SUFFIX}"))
+    else:
+        sources = []
+        pack_paths = [source_path]
+    for pack_path in pack_paths:
+        try:
+            with SegmentPackReader(pack_path) as reader:
+                sources.extend((f"{pack_path}:{entry['name']}", pack_path, entry['name'],
+                                {"sha256": entry.get("sha256") or hashlib.sha256(reader.read(i)).hexdigest()})
+                               for i, entry in enumerate(reader.entries) if entry['name'].endswith(".html"))
+        except (OSError, ValueError) as e:
+            print(f"\n读取打包文件 {pack_path} 时出错: {str(e)}")
+    return sources
+
+def read_html_source(pack_path, name, readers):
+    """读取一个HTML来源的文本；readers 缓存已打开的打包文件，避免每个条目都重新读取索引"""
+    if pack_path is None:
+        with open(name, 'r', encoding='utf-8') as f:
+            return f.read()
+    if pack_path not in readers:
+        readers[pack_path] = SegmentPackReader(pack_path)
+    return readers[pack_path].read(name).decode('utf-8')
+
+def read_html_head(pack_path, name, readers):
+    """只读取HTML文档到 </head> 或 <body> 为止的部分"""
+    if pack_path is not None:
+        content = read_html_source(pack_path, name, readers)
+        match = HEAD_END_PATTERN.search(content)
+        return content[:match.end()] if match else content
+    head = ''
+    with open(name, 'r', encoding='utf-8') as f:
+        while True:
+            chunk = f.read(HEAD_CHUNK_SIZE)
+            if not chunk:
+                return head
+            # 结束标记可能跨块，从上一块末尾附近开始查找
+            search_from = max(0, len(head) - 16)
+            head += chunk
+            match = HEAD_END_PATTERN.search(head, search_from)
+            if match:
+                return head[:match.end()]
+
+def sniff_meta_filename(head):
+    """在文档头部查找第一个 name="filename" 的 meta 标签，返回其 content（属性值按HTML规则反转义）；找不到返回 None"""
+    for tag in META_TAG_PATTERN.finditer(IGNORED_MARKUP_PATTERN.sub('', head)):
+        attrs = {}
+        for attr in ATTRIBUTE_PATTERN.finditer(tag.group(1)):
+            value = next((v for v in attr.group(2, 3, 4) if v is not None), None)
+            attrs[attr.group(1).lower()] = html.unescape(value) if value is not None else ''
+        if attrs.get('name') == 'filename':
+            return attrs.get('content', '')
+    return None
+
+def find_source_filename(pack_path, name, readers):
+    """第一遍：取得 <meta name="filename"> 的值，没有该标签时返回 None。
+    先只看文档头部，头部找不到时再完整解析整个文件，与原来的查找结果一致"""
+    source_filename = sniff_meta_filename(read_html_head(pack_path, name, readers))
+    if source_filename is not None:
+        return source_filename
+    soup = BeautifulSoup(read_html_source(pack_path, name, readers), 'html.parser')
+    meta_tag = soup.find('meta', {'name': 'filename'})
+    if not meta_tag:
+        return None
+    return meta_tag.get('content', '')
+
+class MergeCache:
+    """单个文件夹（或打包文件）的增量合并缓存。清单记录每个输入的指纹、内容哈希、源文件名和提取结果，
+    以及上次生成的输出文件和解析后端；成功提取的单文件文本按内容哈希保存在 texts/ 下，重新合并时直接拼接。
+    解析后端与上次不同时不沿用任何记录"""
+    def __init__(self, folder_path):
+        if os.path.isdir(folder_path):
+            self.path = os.path.join(folder_path, MERGE_CACHE_DIR)
+        else:
+            self.path = os.path.join(os.path.dirname(folder_path), MERGE_CACHE_DIR, os.path.basename(folder_path))
+        self.text_dir = os.path.join(self.path, "texts")
+        try:
+            with open(os.path.join(self.path, MERGE_MANIFEST_NAME), 'r', encoding='utf-8') as f:
+                manifest = json.load(f)
+            if manifest.get("parser") != parser_backend():
+                raise KeyError("parser")
+            self.previous = manifest["inputs"]
+            self.output = manifest.get("output")
+        except (OSError, ValueError, KeyError):
+            self.previous = {}
+            self.output = None
+        self.inputs = {}
+    
+    def is_unchanged(self, sources):
+        """输入集合、每个输入的指纹和上次生成的输出文件都没有变化时返回 True，只需 stat 调用"""
+        if self.output is None or len(sources) != len(self.previous):
+            return False
+        for label, _, _, fingerprint in sources:
+            entry = self.previous.get(label)
+            if entry is None or entry["fingerprint"] != fingerprint or "result" not in entry:
+                return False
+        try:
+            return file_fingerprint(self.output["path"]) == {"size": self.output["size"],
+                                                             "mtime_ns": self.output["mtime_ns"]}
+        except OSError:
+            return False
+    
+    def lookup(self, label, pack_path, name, fingerprint):
+        """返回 (本次的清单条目, 是否沿用上次记录)：指纹相同，或指纹变了但内容哈希相同时沿用"""
+        entry = self.previous.get(label)
+        if entry is not None and entry["fingerprint"] == fingerprint:
+            self.inputs[label] = dict(entry)
+            return self.inputs[label], True
+        sha256 = fingerprint.get("sha256") or file_sha256(name)
+        if entry is not None and entry["sha256"] == sha256:
+            self.inputs[label] = dict(entry, fingerprint=fingerprint)
+            return self.inputs[label], True
+        self.inputs[label] = {"fingerprint": fingerprint, "sha256": sha256}
+        return self.inputs[label], False
+    
+    def forget(self, label):
+        self.inputs.pop(label, None)
+    
+    def text_path(self, entry):
+        return os.path.join(self.text_dir, f"{entry['sha256']}.txt")
+    
+    def is_cached(self, item):
+        """该文件上次已成功处理（提取出文本或确认没有 <body>），本次可直接复用"""
+        entry = self.inputs[item['file_path']]
+        return entry.get("result") == "no_body" or (
+            entry.get("result") == "ok" and os.path.exists(self.text_path(entry)))
+    
+    def load(self, item):
+        """读取缓存的提取结果：文本，没有 <body> 时为 None"""
+        entry = self.inputs[item['file_path']]
+        if entry["result"] == "no_body":
+            return None
+        with open(self.text_path(entry), 'r', encoding='utf-8', newline='') as f:
+            return f.read()
+    
+    def store(self, item, content, error):
+        """记录一个文件的提取结果；出错的文件不记录结果，下次重新提取"""
+        entry = self.inputs[item['file_path']]
+        if error is not None:
+            entry.pop("result", None)
+        elif content is None:
+            entry["result"] = "no_body"
+        else:
+            os.makedirs(self.text_dir, exist_ok=True)
+            text_path = self.text_path(entry)
+            if not os.path.exists(text_path):
+                with open(text_path + ".tmp", 'w', encoding='utf-8', newline='') as f:
+                    f.write(content)
+                os.replace(text_path + ".tmp", text_path)
+            entry["result"] = "ok"
+    
+    def save(self, output_path=None):
+        """保存清单并清理不再被引用的缓存文本；output_path 为本次生成的输出文件，没有生成时为 None"""
+        output = None
+        if output_path is not None:
+            output = dict(file_fingerprint(output_path), path=output_path)
+        os.makedirs(self.path, exist_ok=True)
+        manifest_path = os.path.join(self.path, MERGE_MANIFEST_NAME)
+        with open(manifest_path + ".tmp", 'w', encoding='utf-8') as f:
+            json.dump({"inputs": self.inputs, "output": output, "parser": parser_backend()}, f, ensure_ascii=False)
+        os.replace(manifest_path + ".tmp", manifest_path)
+        
+        referenced = {f"{entry['sha256']}.txt" for entry in self.inputs.values() if entry.get("result") == "ok"}
+        if os.path.isdir(self.text_dir):
+            for name in os.listdir(self.text_dir):
+                if name not in referenced:
+                    os.remove(os.path.join(self.text_dir, name))
+
+def plan_folder(folder_path, readers, cache):
+    """第一遍：取得各文件的源文件名（未变化的文件直接取自缓存清单，其余只读取文档头部），按序列号排序并检查连续性。
+    返回合并计划 {'folder_path', 'output_path', 'items'}，无法合并或输入未变化时返回 None"""
     # 获取所有HTML文件
-    html_files = glob.glob(os.path.join(folder_path, "*.html"))
+    html_files = find_html_sources(folder_path)
     if not html_files:
         print(f"\n文件夹 '{folder_path}' 中没有找到HTML文件，跳过处理。")
-        return
+        return None
+    
+    if cache.is_unchanged(html_files):
+        print(f"\n文件夹 '{folder_path}' 的输入文件未变化，跳过处理: {cache.output['path']}")
+        return None
     
     print(f"\n开始处理文件夹: {folder_path}")
     print(f"\n找到 {len(html_files)} 个HTML文件")
     
-    # 存储文件信息和内容
+    # 打包文件的合并结果写到打包文件所在目录
+    output_dir = folder_path if os.path.isdir(folder_path) else os.path.dirname(folder_path)
+    
+    # 存储文件信息
     file_data = []
     
     # 首先收集所有文件信息和序列号
-    for html_file in html_files:
+    for html_file, pack_path, name, fingerprint in html_files:
         try:
-            with open(html_file, 'r', encoding='utf-8') as f:
-                content = f.read()
+            # 获取源文件名
+            entry, reused = cache.lookup(html_file, pack_path, name, fingerprint)
+            if reused:
+                source_filename = entry["source_filename"]
+            else:
+                source_filename = entry["source_filename"] = find_source_filename(pack_path, name, readers)
             
-            soup = BeautifulSoup(content, 'html.parser')
+            if not source_filename or not re.search(r'(\d+)\.txt$', source_filename):
+                entry["result"] = "skipped"
             
-            # 获取源文件名
-            meta_tag = soup.find('meta', {'name': 'filename'})
-            if not meta_tag:
+            if source_filename is None:
                 print(f"\n警告: 文件 {html_file} 中没有找到 <meta name='filename'> 标签，跳过此文件。")
                 continue
                 
-            source_filename = meta_tag.get('content', '')
             if not source_filename:
                 print(f"\n警告: 文件 {html_file} 中的源文件名为空，跳过此文件。")
                 continue
@@ -53,16 +301,18 @@ def process_folder(folder_path):
                 'file_path': html_file,
                 'source_filename': source_filename,
                 'seq_num': seq_num,
-                'soup': soup
+                'pack_path': pack_path,
+                'name': name
             })
             
         except Exception as e:
             print(f"\n处理文件 {html_file} 时出错: {str(e)}")
+            cache.forget(html_file)
             continue
     
     if not file_data:
         print(f"\n文件夹 '{folder_path}' 中没有有效的HTML文件，跳过处理。")
-        return
+        return None
     
     # 按序列号排序
     file_data.sort(key=lambda x: x['seq_num'])
@@ -78,75 +328,252 @@ def process_folder(folder_path):
     if expected_seq != actual_seq:
         missing = set(expected_seq) - set(actual_seq)
         print(f"\n错误: 序列号不连续! 缺失的文件: {sorted(missing)}")
-        return
+        return None
     
     print(f"\n序列号检查通过，共有 {total_files} 个文件，序列号位数为 {seq_digits}")
     
-    # 提取共同的文件名前缀
+    # 提取共同的文件名前缀，生成输出文件名
     base_name = re.sub(r'_\d+\.txt$', '', file_data[0]['source_filename'])
+    output_filename = f"Solution_{base_name}.txt"
     
-    # 处理每个文件并提取内容
-    extracted_contents = []
-    
-    print(f"\n开始提取内容:")
-    for item in tqdm(file_data, desc=f"\n处理 {folder_path}"):
-        try:
-            # 提取body内容
-            body = item['soup'].find('body')
-            if not body:
-                print(f"\n警告: 文件 {item['file_path']} 中没有找到<body>标签")
-                continue
-                
-            # 提取所有段落文本
-            paragraphs = []
-            for p in body.find_all('p'):
-                text = p.get_text().strip()
-                if text:  # 只添加非空段落
-                    paragraphs.append(text)
-            
-            # 在段落之间添加空行
-            content = '\n\n'.join(paragraphs)
-            extracted_contents.append(content)
-            
-        except Exception as e:
-            print(f"\n提取文件 {item['file_path']} 内容时出错: {str(e)}")
-            continue
+    for item in file_data:
+        item['cached'] = cache.is_cached(item)
     
-    if not extracted_contents:
-        print(f"\n没有成功提取任何内容，跳过写入文件。")
-        return
+    return {
+        'folder_path': folder_path,
+        'output_path': os.path.join(output_dir, output_filename),
+        'items': file_data
+    }
+
+def extract_paragraphs_bs4(content):
+    """BeautifulSoup 解析路径（未安装 lxml 时的后备方案）：返回 <body> 中每个段落去除首尾空白后的文本"""
+    soup = BeautifulSoup(content, 'html.parser')
     
-    # 合并所有内容
-    merged_content = '\n\n'.join(extracted_contents)
+    # 提取body内容
+    body = soup.find('body')
+    if not body:
+        return None
+    return [p.get_text().strip() for p in body.find_all('p')]
+
+def extract_paragraphs_lxml(content):
+    """lxml（libxml2）解析路径：解析后只遍历一次 <body> 子树取出所有段落文本；
+    只用于 lxml_compatible() 通过的文档，结果与 BeautifulSoup 路径一致"""
+    body = parse_document(content).find('body')
+    if body is None:
+        return None
+    return [text.strip() for _, text in lxml_block_texts(body, ("p",), RUBY_AND_SCRIPT_TAGS)]
+
+def extract_html(content):
+    """解析一个HTML文档，返回 <body> 中所有非空段落文本（以空行分隔）；没有 <body> 时返回 None。
+    默认优先使用 lxml，未安装时或 lxml 与 html.parser 的解析树可能不同（省略结束标签、块元素嵌在段落中等）时
+    使用 BeautifulSoup，两条路径的结果相同"""
+    if parser_backend() == "lxml" and lxml_compatible(content):
+        paragraphs = extract_paragraphs_lxml(content)
+    else:
+        paragraphs = extract_paragraphs_bs4(content)
+    if paragraphs is None:
+        return None
     
-    # 生成输出文件名
-    output_filename = f"Solution_{base_name}.txt"
-    output_path = os.path.join(folder_path, output_filename)
+    # 只保留非空段落，在段落之间添加空行
+    return '\n\n'.join(text for text in paragraphs if text)
+
+def parser_backend():
+    """实际使用的解析后端名称（lxml 或 bs4），也记录在合并缓存的清单中"""
+    return resolve_backend(PARSER_BACKEND)
+
+def set_parser_backend(backend):
+    """设置解析后端；也作为进程池的初始化函数，使工作进程与主进程使用同一后端"""
+    global PARSER_BACKEND
+    PARSER_BACKEND = backend
+
+_worker_readers = {}
+
+def _extract_worker(pack_path, name):
+    """进程池入口：读取并提取单个HTML来源，工作进程内缓存已打开的打包文件"""
+    return extract_html(read_html_source(pack_path, name, _worker_readers))
+
+def write_merged(plan, results):
+    """按序列号顺序把每个文件的提取结果直接写入临时文件（文件之间以空行分隔），完成后替换为正式输出文件；
+    results 依次产出每个文件的 (提取文本或None, 异常或None)。内存中最多只保留一个文件的内容。
+    返回生成的输出文件路径，没有生成时返回 None"""
+    output_path = plan['output_path']
+    temp_path = output_path + ".tmp"
+    written = 0
     
-    # 写入文件
+    print(f"\n开始提取内容:")
     try:
-        with open(output_path, 'w', encoding='utf-8') as f:
-            f.write(merged_content)
+        try:
+            with open(temp_path, 'w', encoding='utf-8') as f:
+                for item, (content, error) in zip(tqdm(plan['items'], desc=f"\n处理 {plan['folder_path']}"), results):
+                    if error is not None:
+                        print(f"\n提取文件 {item['file_path']} 内容时出错: {str(error)}")
+                        continue
+                    if content is None:
+                        print(f"\n警告: 文件 {item['file_path']} 中没有找到<body>标签")
+                        continue
+                    if written:
+                        f.write('\n\n')
+                    f.write(content)
+                    written += 1
+        except Exception as e:
+            print(f"\n写入输出文件时出错: {str(e)}")
+            return None
+        
+        if not written:
+            print(f"\n没有成功提取任何内容，跳过写入文件。")
+            return None
+        
+        os.replace(temp_path, output_path)
         print(f"\n成功生成文件: {output_path}")
+        return output_path
+    finally:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+
+def extract_source(item, readers):
+    """在当前进程中读取并提取单个文件，返回 (提取文本或None, 异常或None)"""
+    try:
+        return extract_html(read_html_source(item['pack_path'], item['name'], readers)), None
     except Exception as e:
-        print(f"\n写入输出文件时出错: {str(e)}")
+        return None, e
+
+def merged_results(plan, cache, extracted, readers):
+    """按顺序产出一个文件夹中每个文件的 (提取文本或None, 异常或None)：
+    未变化的文件直接取缓存文本，其余文件的结果依次取自 extracted 并写入缓存"""
+    for item in plan['items']:
+        if item['cached']:
+            try:
+                yield cache.load(item), None
+                continue
+            except OSError:
+                content, error = extract_source(item, readers)
+        else:
+            content, error = next(extracted)
+        cache.store(item, content, error)
+        yield content, error
+
+def process_folder(folder_path):
+    """处理单个文件夹（或 .segpack 打包文件）中的所有HTML文件：
+    第一遍确定顺序，第二遍按顺序逐个解析并提取（未变化的文件复用缓存文本），每个文件的文档树用完即丢弃"""
+    readers = {}
+    cache = MergeCache(folder_path)
+    try:
+        plan = plan_folder(folder_path, readers, cache)
+        if plan is None:
+            if cache.inputs:
+                cache.save()
+            return
+        
+        extracted = (extract_source(item, readers) for item in plan['items'] if not item['cached'])
+        cache.save(write_merged(plan, merged_results(plan, cache, extracted, readers)))
+    finally:
+        for reader in readers.values():
+            reader.close()
+
+def submit_bounded(executor, fn, args_iter, window):
+    """按顺序提交任务并依次产出 future，同时处于提交未取走状态的任务最多 window 个，限制结果占用的内存"""
+    pending = deque()
+    for args in args_iter:
+        pending.append(executor.submit(fn, *args))
+        if len(pending) >= window:
+            yield pending.popleft()
+    while pending:
+        yield pending.popleft()
+
+def process_folders_parallel(folders, jobs):
+    """多进程模式：先串行完成所有文件夹的第一遍，再把所有文件夹中需要重新提取的文件按顺序提交到同一个进程池解析提取，
+    按文件夹和序列号顺序流式写出（未变化的文件复用缓存文本），输出与串行模式逐字节一致"""
+    readers = {}
+    plans = []
+    try:
+        for folder in folders:
+            cache = MergeCache(folder)
+            plan = plan_folder(folder, readers, cache)
+            if plan is not None:
+                plans.append((plan, cache))
+            elif cache.inputs:
+                cache.save()
+        if not plans:
+            return
+        
+        def results(futures):
+            for future in futures:
+                try:
+                    yield future.result(), None
+                except Exception as e:
+                    yield None, e
+        
+        # 只有需要重新提取的文件才提交到进程池
+        with ProcessPoolExecutor(max_workers=jobs, initializer=set_parser_backend,
+                                 initargs=(PARSER_BACKEND,)) as executor:
+            sources = ((item['pack_path'], item['name'])
+                       for plan, _ in plans for item in plan['items'] if not item['cached'])
+            extracted = results(submit_bounded(executor, _extract_worker, sources, jobs * IN_FLIGHT_PER_WORKER))
+            for plan, cache in plans:
+                results_of_plan = merged_results(plan, cache, extracted, readers)
+                output_path = write_merged(plan, results_of_plan)
+                # 写入中途失败时取走该文件夹剩余的结果，保证后面的文件夹与进程池结果对齐
+                deque(results_of_plan, maxlen=0)
+                cache.save(output_path)
+    finally:
+        for reader in readers.values():
+            reader.close()
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="HTML小说文件合并及提取工具")
+    parser.add_argument("--jobs", type=int, default=1,
+                        help="并行解析HTML文件的进程数（0 表示使用全部CPU核心）")
+    parser.add_argument("--pack", action="store_true",
+                        help="把每个文件夹中的HTML文件打包为同名 .segpack 文件后退出；之后合并时以打包文件代替该文件夹")
+    parser.add_argument("--parser", choices=["auto", "lxml", "bs4"], default="auto",
+                        help="段落提取的解析后端：auto 在安装了 lxml 时使用 lxml，否则使用 BeautifulSoup")
+    return parser.parse_args()
 
 def main():
     """主函数"""
+    args = parse_args()
+    if args.parser == "lxml" and lxml_html is None:
+        print("\n错误：未安装 lxml，请执行 pip install lxml 或改用 --parser bs4")
+        return
+    set_parser_backend(args.parser)
     print("HTML小说文件合并及提取工具")
     print("=" * 50)
     
-    # 获取所有文件夹
-    folders = get_all_folders()
-    if not folders:
-        print("当前目录下没有找到任何文件夹。")
+    if args.pack:
+        for folder in get_all_folders():
+            try:
+                count = pack_html_folder(folder)
+            except (OSError, UnicodeDecodeError) as e:
+                print(f"\n打包文件夹 '{folder}' 时出错: {str(e)}")
+                continue
+            if count:
+                print(f"\n已将文件夹 '{folder}' 中的 {count} 个HTML文件打包为 {folder}{PACK_SUFFIX}")
+        print("\n打包完成!")
+        return
+    
+    # 获取所有文件夹；已有同名HTML打包文件的文件夹改由打包文件合并，避免重复输出
+    packs = get_all_packs()
+    folders = []
+    for folder in get_all_folders():
+        if folder + PACK_SUFFIX in packs:
+            print(f"\n文件夹 '{folder}' 已打包为 {folder}{PACK_SUFFIX}，使用打包文件")
+        else:
+            folders.append(folder)
+    if not folders and not packs:
+        print("当前目录下没有找到任何文件夹或打包文件。")
         return
     
     print(f"\n找到 {len(folders)} 个文件夹: {', '.join(folders)}")
+    if packs:
+        print(f"\n找到 {len(packs)} 个打包文件: {', '.join(packs)}")
     
-    # 处理每个文件夹
-    for folder in folders:
-        process_folder(folder)
+    # 处理每个文件夹和打包文件
+    jobs = args.jobs or os.cpu_count()
+    if jobs > 1:
+        process_folders_parallel(folders + packs, jobs)
+    else:
+        for folder in folders + packs:
+            process_folder(folder)
     
     print("\n处理完成!")
 
@@ -0,0 +1,182 @@
+"""HTML块文本提取：lxml（libxml2）快速路径与 BeautifulSoup(html.parser) 路径共用的规则。
+lxml_compatible() 判断文档能否走快速路径，lxml_block_texts() / lxml_text() 按 get_text() 的规则取文本；
+HTML合并工具、EPUB转换工具与 kakuyomu 爬虫共用"""
+import re
+from html.entities import html5 as html5_entities
+
+try:
+    from lxml import html as lxml_html
+except ImportError:
+    lxml_html = None
+
+RUBY_AND_SCRIPT_TAGS = ("rt", "rp", "script", "style", "template")
+
+# 注释、脚本和样式中的内容不参与解析树一致性检查（HTML合并工具读取 <meta> 时同样跳过）
+IGNORED_MARKUP_PATTERN = re.compile(
+    r'<!--.*?(?:-->|$)|<script\b.*?(?:</script\s*>|$)|<style\b.*?(?:</style\s*>|$)', re.I | re.S)
+
+# 只有 libxml2 与 html.parser 建出相同文档树时才走 lxml 快速路径：标签显式闭合且正确嵌套，
+# 不触发 libxml2 的隐式结束规则（如块元素结束 <p>、未闭合的 <li> 被下一个 <li> 结束），正文元素都在唯一的 <body> 内
+TAG_PATTERN = re.compile(r'<(/?)([a-zA-Z][^\t\n\r\f />\x00]*)((?:[^>"\']+|"[^"]*"|\'[^\']*\')*)>')
+ENTITY_PATTERN = re.compile(r'&(?:#[xX]?[0-9a-fA-F]*|([a-zA-Z][-.a-zA-Z0-9]*))')  # 名称规则与 html.parser 相同
+NUMERIC_REFERENCE_PATTERN = re.compile(r'&#(?:[0-9]+|[xX][0-9a-fA-F]+)')
+# "</" 后不是字母（如 "</ p>"）：libxml2 当作注释丢弃，html.parser 则吞掉其后的文本
+BOGUS_END_TAG_PATTERN = re.compile(r'</(?![a-zA-Z])')
+VOID_ELEMENTS = frozenset(["area", "base", "basefont", "bgsound", "br", "col", "command", "embed", "frame",
+                           "hr", "image", "img", "input", "isindex", "keygen", "link", "menuitem", "meta",
+                           "nextid", "param", "source", "spacer", "track", "wbr"])
+HEAD_ELEMENTS = frozenset(["html", "head", "title", "base", "link", "meta", "style", "script", "noscript"])
+# libxml2 的隐式结束规则：当前元素为键时，遇到值中的开始标签会先结束当前元素，html.parser 则一律嵌套
+AUTO_CLOSE = {tag: frozenset(closers.split()) for tag, closers in {
+    "a": "a fieldset table td th",
+    "address": "dd dl dt form li ul",
+    "b": "center p td th",
+    "big": "p",
+    "caption": "col colgroup tbody tfoot thead tr",
+    "colgroup": "colgroup tbody tfoot thead tr",
+    "dd": "dt",
+    "dir": "dd dl dt form ul",
+    "dl": "form li",
+    "dt": "dd dl",
+    "font": "center td th",
+    "form": "form",
+    "i": "center p td th",
+    "legend": "fieldset",
+    "li": "li",
+    "listing": "dd dl dt fieldset form li table ul",
+    "menu": "dd dl dt form ul",
+    "ol": "form",
+    "option": "optgroup option",
+    "p": "address article aside blockquote caption center col colgroup dd details dialog dir div dl dt "
+         "fieldset figcaption figure footer form frameset h1 h2 h3 h4 h5 h6 head header hgroup hr legend li "
+         "listing main menu nav ol p plaintext pre section summary table tbody td tfoot th thead title tr ul xmp",
+    "pre": "dd dl dt fieldset form li table ul",
+    "s": "p",
+    "small": "p",
+    "span": "td th",
+    "strike": "p",
+    "tbody": "tbody tfoot",
+    "td": "tbody td tfoot th tr",
+    "tfoot": "tbody",
+    "th": "tbody td tfoot th tr",
+    "thead": "tbody tfoot",
+    "tr": "tbody tfoot tr",
+    "tt": "p",
+    "u": "p td th",
+    "ul": "address form menu pre",
+}.items()}
+for heading in ("h1", "h2", "h3", "h4", "h5", "h6"):
+    AUTO_CLOSE[heading] = frozenset(["fieldset", "form", "li", "p", "table"])
+# 外层元素的结束标签可以顺带结束这些省略了结束标签的元素
+IMPLIED_END_ELEMENTS = frozenset(["p", "li", "dt", "dd", "option", "optgroup", "tr", "td", "th", "thead",
+                                  "tbody", "tfoot", "colgroup", "caption", "rb", "rt", "rp", "rtc"])
+# 两者对内容的处理方式不同（原样文本、保留空白或另行解析）的元素
+UNSAFE_ELEMENTS = frozenset(["textarea", "plaintext", "xmp", "listing", "pre", "noembed", "noframes", "iframe"])
+# libxml2 会丢弃 <table> 之外的表格结构标签
+TABLE_PART_ELEMENTS = frozenset(["caption", "col", "colgroup", "thead", "tbody", "tfoot", "tr", "td", "th"])
+
+if lxml_html is not None:
+    # 文本先编码为 UTF-8 再交给 libxml2，忽略文档中 <meta charset> 声明的原始编码
+    UTF8_HTML_PARSER = lxml_html.HTMLParser(encoding='utf-8')
+
+def resolve_backend(choice):
+    """把 auto/lxml/bs4 选项解析为实际使用的后端：auto 在安装了 lxml 时为 lxml，否则为 bs4"""
+    return "lxml" if choice == "lxml" or (choice == "auto" and lxml_html is not None) else "bs4"
+
+def parse_document(markup):
+    """用 libxml2 解析已解码的文档文本，返回根元素"""
+    return lxml_html.document_fromstring(markup.encode('utf-8'), parser=UTF8_HTML_PARSER)
+
+def lxml_compatible(markup):
+    """判断 libxml2 解析 markup 能否得到与 html.parser 相同的文档树，不能时应改用 BeautifulSoup。
+    要求：有唯一的 <body> 且正文元素都在其中；除空元素外标签都显式闭合并正确嵌套
+    （段落、列表项等的结束标签只能在外层元素结束时省略）；没有 CDATA、不规范的结束标签、
+    两者解码结果不同的字符实体、回车符和 NUL 字符（libxml2 会替换为 U+FFFD）"""
+    if '\r' in markup or '\x00' in markup:
+        return False
+    markup = IGNORED_MARKUP_PATTERN.sub('', markup)
+    if '<![' in markup or BOGUS_END_TAG_PATTERN.search(markup):
+        return False
+    for match in ENTITY_PATTERN.finditer(markup):
+        # html.parser 把文档末尾未结束的引用和未知名称原样保留，libxml2 则会按前缀解码；
+        # 不带分号时只有 &copy 这类旧式名称两者一致；数字引用必须有数字并以分号结束
+        if match.end() == len(markup):
+            return False
+        name = match.group(1)
+        terminated = markup.startswith(';', match.end())
+        if name is None:
+            if not terminated or not NUMERIC_REFERENCE_PATTERN.fullmatch(match.group()):
+                return False
+        elif (name + ';' if terminated else name) not in html5_entities:
+            return False
+    stack = []
+    seen_body = False
+    for match in TAG_PATTERN.finditer(markup):
+        closing, name, attrs = match.groups()
+        name = name.lower()
+        if closing:
+            if name in VOID_ELEMENTS or name not in stack:
+                return False
+            while stack[-1] != name:
+                if stack.pop() not in IMPLIED_END_ELEMENTS:
+                    return False
+            stack.pop()
+            continue
+        if name in UNSAFE_ELEMENTS or (name in TABLE_PART_ELEMENTS and "table" not in stack):
+            return False
+        if stack and name in AUTO_CLOSE.get(stack[-1], ()):
+            return False
+        if name == "body":
+            if seen_body:
+                return False
+            seen_body = True
+            if stack and stack[-1] == "head":
+                stack.pop()
+        elif "body" in stack:
+            if name == "title":
+                return False
+        elif name not in HEAD_ELEMENTS:
+            return False
+        if name not in VOID_ELEMENTS and not attrs.endswith('/'):
+            stack.append(name)
+    return seen_body
+
+def lxml_block_texts(element, block_tags, skip_tags=()):
+    """一次遍历 lxml 元素树，按文档顺序返回每个 block_tags 元素的 (标签名, 文本)。
+    文本按 BeautifulSoup(html.parser) 的 get_text() 规则拼接：跳过注释与 skip_tags 内的文本，
+    纯空白文本节点折叠为单个换行（含换行时）或空格；嵌套的块元素各自产出，外层文本包含内层文本"""
+    parts = []
+    blocks = []
+    
+    def add(text):
+        if not text:
+            return
+        if not text.strip(" \t\n\r\f"):
+            text = "\n" if "\n" in text else " "
+        parts.append(text)
+    
+    def walk(node, hidden):
+        if not isinstance(node.tag, str):
+            return
+        # skip_tags 内的文本不计入，但其中的块元素仍然产出（文本为空），与 find_all() 一致
+        hidden = hidden or node.tag in skip_tags
+        slot = None
+        if node.tag in block_tags:
+            # 先占位再遍历子树，保证外层块排在内层块之前
+            slot, start = len(blocks), len(parts)
+            blocks.append(None)
+        if not hidden:
+            add(node.text)
+        for child in node:
+            walk(child, hidden)
+            if not hidden:
+                add(child.tail)
+        if slot is not None:
+            blocks[slot] = (node.tag, "".join(parts[start:]))
+    
+    walk(element, False)
+    return blocks
+
+def lxml_text(element, skip_tags=()):
+    """按与 lxml_block_texts() 相同的规则拼接单个元素的全部文本"""
+    return lxml_block_texts(element, (element.tag,), skip_tags)[0][1]
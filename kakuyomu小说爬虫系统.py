@@ -1,102 +1,549 @@
+import os
 import re
-import requests
+import json
 import time
+import hashlib
+import argparse
+import threading
+import itertools
+import functools
+from html import unescape
 from bs4 import BeautifulSoup
 from tqdm import tqdm
+import scrape_fetch
+from scrape_fetch import metrics, fetch, fetch_many, add_fetch_arguments
+from html_block_extract import RUBY_AND_SCRIPT_TAGS, lxml_text, resolve_backend
+
+try:
+    from lxml import etree
+    from lxml import html as lxml_html
+except ImportError:
+    lxml_html = None
+
+BASE_URL = "https://kakuyomu.jp"
+GROUP_TITLE_CLASS = "chapterTitle level1 js-vertical-composition-item"
+EPISODE_TITLE_CLASS = "widget-episodeTitle js-vertical-composition-item"
+EPISODE_BODY_CLASS = "widget-episodeBody js-episode-body"
+PARSER_BACKEND = "auto"
+
+class ChapterStore:
+    """章节断点存储：已完成章节逐条追加到 chapters.jsonl，内存中只保留 URL→偏移量 索引；
+    manifest.json 记录每个章节的 ETag/Last-Modified 与正文哈希，供增量更新使用"""
+    def __init__(self, directory):
+        os.makedirs(directory, exist_ok=True)
+        self.path = os.path.join(directory, "chapters.jsonl")
+        self.manifest_path = os.path.join(directory, "manifest.json")
+        self.lock = threading.Lock()
+        self.index = {}
+        self.manifest = {}
+        self._load()
+
+    def _load(self):
+        """扫描已有记录重建索引；中断时写了一半的末行会被截掉"""
+        if not os.path.exists(self.path):
+            return
+        offset = 0
+        with open(self.path, 'rb') as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    break
+                self.index[record["url"]] = (offset, record.get("next"))
+                offset += len(line)
+        if offset != os.path.getsize(self.path):
+            with open(self.path, 'r+b') as f:
+                f.truncate(offset)
+        if os.path.exists(self.manifest_path):
+            with open(self.manifest_path, 'r', encoding='utf-8') as f:
+                self.manifest = json.load(f)
+
+    def __contains__(self, url):
+        return url in self.index
+
+    def __len__(self):
+        return len(self.index)
+
+    def next_url(self, url):
+        return self.index[url][1]
+
+    def read(self, url):
+        """按索引偏移读取单个章节正文"""
+        with open(self.path, 'rb') as f:
+            f.seek(self.index[url][0])
+            return json.loads(f.readline())["content"]
+
+    def append(self, url, content, next_url=None, response=None):
+        """追加一条已完成章节并立即落盘；同一URL的新记录覆盖旧记录"""
+        line = (json.dumps({"url": url, "next": next_url, "content": content}, ensure_ascii=False) + "\n").encode('utf-8')
+        with self.lock:
+            with open(self.path, 'ab') as f:
+                offset = f.tell()
+                f.write(line)
+                f.flush()
+                os.fsync(f.fileno())
+            self.index[url] = (offset, next_url)
+            self.manifest[url] = {"sha256": hashlib.sha256(content.encode('utf-8')).hexdigest()}
+            self.update_validators(url, response)
+
+    def update_validators(self, url, response):
+        """记录响应中的缓存校验头"""
+        if response is None or url not in self.manifest:
+            return
+        entry = self.manifest[url]
+        entry["etag"] = response.headers.get("ETag")
+        entry["last_modified"] = response.headers.get("Last-Modified")
+
+    def validators(self, url):
+        """生成条件请求头（If-None-Match / If-Modified-Since）"""
+        entry = self.manifest.get(url, {})
+        headers = {}
+        if entry.get("etag"):
+            headers["If-None-Match"] = entry["etag"]
+        if entry.get("last_modified"):
+            headers["If-Modified-Since"] = entry["last_modified"]
+        return headers
+
+    def is_same(self, url, content, next_url):
+        """判断新下载的章节与缓存是否一致（正文哈希与下一话链接）"""
+        entry = self.manifest.get(url)
+        return (entry is not None and url in self.index and self.index[url][1] == next_url
+                and entry["sha256"] == hashlib.sha256(content.encode('utf-8')).hexdigest())
+
+    def save_manifest(self):
+        """原子写入 manifest.json"""
+        with self.lock:
+            tmp_path = self.manifest_path + ".tmp"
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(self.manifest, f, ensure_ascii=False, indent=1)
+            os.replace(tmp_path, self.manifest_path)
+
+class OrderedWriter:
+    """按章节顺序流式写出全文：乱序完成的章节只在重排缓冲区记下键（章节URL），
+    轮到时再用 loader 从断点存储读出正文写入，内存占用与作品长度无关；
+    fsync_policy 为 none（不强制落盘）、chapter（每章落盘）或 end（结束时落盘一次）"""
+    def __init__(self, path, loader, fsync_policy="end", separator="\n\n"):
+        self.path = path
+        self.tmp_path = path + ".part"
+        self.loader = loader
+        self.fsync_policy = fsync_policy
+        self.separator = separator
+        self.file = open(self.tmp_path, 'w', encoding='utf-8')
+        self.buffer = {}
+        self.next_index = 0
+
+    def put(self, index, key, content=None):
+        """提交第 index 章（从0开始）；正好轮到且给出了 content 时直接写入，
+        否则只暂存 key，之前的章节全部到齐后再读取正文写入"""
+        if index == self.next_index and content is not None:
+            self._write(content)
+        else:
+            self.buffer[index] = key
+        while self.next_index in self.buffer:
+            self._write(self.loader(self.buffer.pop(self.next_index)))
+
+    def _write(self, content):
+        if self.next_index:
+            self.file.write(self.separator)
+        self.file.write(content)
+        self.next_index += 1
+        if self.fsync_policy == "chapter":
+            self.file.flush()
+            os.fsync(self.file.fileno())
+
+    def close(self):
+        """关闭文件；写入过章节则原子替换为正式文件，返回已写出的章节数"""
+        self.file.flush()
+        if self.fsync_policy != "none":
+            os.fsync(self.file.fileno())
+        self.file.close()
+        if self.next_index:
+            os.replace(self.tmp_path, self.path)
+        else:
+            os.remove(self.tmp_path)
+        return self.next_index
 
 def clean_html_tags(text):
-    """清除HTML标签并保留换行符[[139]][[140]]"""
-    clean_text = re.sub(r'<[^>]+>', '', text)
-    clean_text = re.sub(r'\n{2,}', '\n\n', clean_text)
-    return clean_text.strip()
+    """清除HTML标签并还原字符实体[[139]][[140]]"""
+    return unescape(re.sub(r'<[^>]+>', '', text))
 
-def get_chapter_content(url):
-    """获取章节内容[[97]][[102]][[106]]"""
-    try:
-        response = requests.get(url, timeout=10)
-        soup = BeautifulSoup(response.text, 'html.parser')
-        
-        # 获取章节组标题
-        group_title = ""
-        group_tag = soup.find(class_="chapterTitle level1 js-vertical-composition-item")
-        if group_tag and group_tag.span:
-            group_title = group_tag.span.text + "\n\n"
-        
-        # 获取章节标题
-        chapter_title = ""
-        title_tag = soup.find(class_="widget-episodeTitle js-vertical-composition-item")
-        if title_tag:
-            chapter_title = title_tag.text + "\n\n"
-        
-        # 获取正文内容
-        body_tag = soup.find(class_="widget-episodeBody js-episode-body")
-        body_content = clean_html_tags(str(body_tag)) if body_tag else ""
-        
-        return group_title + chapter_title + body_content
+def normalize_body_text(text):
+    """压缩连续空行并去除首尾空白，保留段落换行[[139]][[140]]"""
+    return re.sub(r'\n{2,}', '\n\n', text).strip()
+
+def parse_chapter_bs4(html):
+    """BeautifulSoup 解析路径（未安装 lxml 时的后备方案）"""
+    soup = BeautifulSoup(html, 'html.parser')
+    group_tag = soup.find(class_=GROUP_TITLE_CLASS)
+    title_tag = soup.find(class_=EPISODE_TITLE_CLASS)
+    body_tag = soup.find(class_=EPISODE_BODY_CLASS)
+    next_tag = soup.select_one('#contentMain-nextEpisode a')
+    return (group_tag.span.text if group_tag and group_tag.span else None,
+            title_tag.text if title_tag else None,
+            clean_html_tags(str(body_tag)) if body_tag else None,
+            next_tag['href'] if next_tag else None)
+
+if lxml_html is not None:
+    XPATH_GROUP_TITLE = etree.XPath(f'(//*[@class="{GROUP_TITLE_CLASS}"])[1]//span[1]')
+    XPATH_EPISODE_TITLE = etree.XPath(f'(//*[@class="{EPISODE_TITLE_CLASS}"])[1]')
+    XPATH_EPISODE_BODY = etree.XPath(f'(//*[@class="{EPISODE_BODY_CLASS}"])[1]')
+    XPATH_NEXT_HREF = etree.XPath('(//*[@id="contentMain-nextEpisode"]//a)[1]/@href')
+
+def parse_chapter_lxml(html):
+    """lxml（libxml2）解析路径：只用预编译XPath定位标题、正文与下一话链接，直接取文本"""
+    root = lxml_html.document_fromstring(html)
+    group_tags = XPATH_GROUP_TITLE(root)
+    title_tags = XPATH_EPISODE_TITLE(root)
+    body_tags = XPATH_EPISODE_BODY(root)
+    next_hrefs = XPATH_NEXT_HREF(root)
+    # 标题与 BeautifulSoup 的 .text 一致，不含注音与脚本；正文保留注音
+    return (lxml_text(group_tags[0], RUBY_AND_SCRIPT_TAGS) if group_tags else None,
+            lxml_text(title_tags[0], RUBY_AND_SCRIPT_TAGS) if title_tags else None,
+            lxml_text(body_tags[0]) if body_tags else None,
+            str(next_hrefs[0]) if next_hrefs else None)
+
+def parse_chapter(html):
+    """解析章节页面：同一棵解析树同时产出正文与下一话链接；
+    默认优先使用 lxml，未安装时退回 BeautifulSoup"""
+    if resolve_backend(PARSER_BACKEND) == "lxml":
+        group_title, chapter_title, body_text, next_href = parse_chapter_lxml(html)
+    else:
+        group_title, chapter_title, body_text, next_href = parse_chapter_bs4(html)
     
-    except Exception as e:
-        print(f"\n章节解析失败: {url} | 错误: {e}")
-        return ""
+    # 章节组标题 + 章节标题 + 正文
+    content = ""
+    if group_title is not None:
+        content += group_title + "\n\n"
+    if chapter_title is not None:
+        content += chapter_title + "\n\n"
+    if body_text is not None:
+        content += normalize_body_text(body_text)
+    
+    next_url = BASE_URL + next_href if next_href else None
+    return content, next_url
 
-def main():
-    """主爬虫程序"""
-    # 01. 获取小说编号[[41]][[46]]
-    novel_id = input("请输入小说编号（如1177354054889466403）: ")
-    base_url = f"https://kakuyomu.jp/works/{novel_id}"
+def fetch_chapter(url, headers=None):
+    """下载并解析章节页面（单次请求），返回 (正文, 下一话链接, 响应)；
+    条件请求命中304时正文与链接均为None"""
+    response = fetch(url, headers=headers)
+    if response.status_code == 304:
+        return None, None, response
+    with metrics.timer(url, "parse"):
+        content, next_url = parse_chapter(response.text)
+    return content, next_url, response
+
+def get_episode_urls(html, novel_id):
+    """从作品主页解析完整目录，按原顺序返回全部章节链接"""
+    episode_ids = []
+    match = re.search(r'<script id="__NEXT_DATA__" type="application/json">(.*?)</script>', html, re.S)
+    if match:
+        try:
+            state = json.loads(match.group(1))["props"]["pageProps"]["__APOLLO_STATE__"]
+            work = state[f"Work:{novel_id}"]
+            for toc_ref in work.get("tableOfContents", []):
+                chapter = state.get(toc_ref["__ref"], {})
+                for episode_ref in chapter.get("episodeUnions", []):
+                    episode_ids.append(episode_ref["__ref"].split(":", 1)[1])
+        except (KeyError, TypeError, ValueError):
+            episode_ids = []
     
-    # 02. 获取第一章节链接[[97]][[102]]
-    try:
-        response = requests.get(base_url, timeout=10)
-        soup = BeautifulSoup(response.text, 'html.parser')
-        first_chapter_tag = soup.select_one('.Layout_layout__5aFuw.Layout_items-normal__4mOqD.Layout_justify-normal__zqNe7.Layout_direction-row__boh0Z.Layout_wrap-wrap__yY3zM.Layout_gap-2s__xUCm0 a')
-        next_url = "https://kakuyomu.jp" + first_chapter_tag['href'] if first_chapter_tag else None
-        
-        if not next_url:
-            print("\n错误：未找到章节链接")
-            return
-    except Exception as e:
-        print(f"\n主页解析失败: {e}")
-        return
+    # 目录数据缺失时退回到页面内的章节链接
+    if not episode_ids:
+        episode_ids = list(dict.fromkeys(re.findall(rf'/works/{novel_id}/episodes/(\d+)', html)))
     
-    # 03-05. 爬取所有章节[[97]][[102]][[106]]
-    chapters = []
+    return [f"{BASE_URL}/works/{novel_id}/episodes/{episode_id}" for episode_id in episode_ids]
+
+def crawl_serial(next_url, store, writer):
+    """顺序爬取：沿"下一话"链接逐章前进，已完成章节直接从断点存储读取"""
     chapter_count = 0
     progress_bar = tqdm(desc="\n开始爬取", unit="章")
     
+    # 跳过已完成章节，定位到第一个缺失章节
+    while next_url and next_url in store:
+        writer.put(chapter_count, next_url)
+        next_url = store.next_url(next_url)
+        chapter_count += 1
+        progress_bar.update(1)
+    if chapter_count:
+        print(f"\n从断点恢复：已跳过 {chapter_count} 个已完成章节")
+    
     while next_url:
         try:
-            # 添加延迟避免封IP[[68]][[72]]
-            time.sleep(1.5)  
-            
-            # 获取章节内容
-            content = get_chapter_content(next_url)
-            chapters.append(content)
+            # 获取章节内容及下一章链接（同一次请求）[[97]][[102]]
+            url = next_url
+            content, next_url, response = fetch_chapter(url)
+            store.append(url, content, next_url, response)
+            with metrics.timer(url, "write"):
+                writer.put(chapter_count, url, content)
+            metrics.count("chapters")
             chapter_count += 1
             
             # 更新进度条[[175]]
             progress_bar.set_description_str(f"\n正在爬取第{chapter_count}章")
             progress_bar.update(1)
             
-            # 04. 获取下一章链接
-            response = requests.get(next_url, timeout=10)
-            soup = BeautifulSoup(response.text, 'html.parser')
-            next_tag = soup.select_one('#contentMain-nextEpisode a')
-            next_url = "https://kakuyomu.jp" + next_tag['href'] if next_tag else None
-            
         except Exception as e:
-            print(f"\n爬取中断: {e}")
+            print(f"\n爬取中断: {e}（已完成章节已保存，重新运行即可续爬）")
             break
     
     progress_bar.close()
+
+def crawl_works(jobs, workers, engine="thread", update=False, revalidate=True):
+    """按目录并发爬取一个或多个作品：所有作品共享同一并发上限与主机限速器，
+    各作品的待抓章节轮转交错提交，避免某部长篇独占请求额度。
+    update=True 时为增量更新：新章节完整下载，已有章节用条件请求校验，仅在变化时重新保存。
+    每个 job 为 dict，需包含 novel_id、episode_urls、store、writer，统计结果写回 job["counts"]"""
+    queues = []
+    for job in jobs:
+        job["counts"] = {"new": 0, "changed": 0, "unchanged": 0, "cached": 0, "failed": 0}
+        job["remaining"] = 0
+        store, queue = job["store"], []
+        for idx, url in enumerate(job["episode_urls"]):
+            if url in store and not update:
+                job["counts"]["cached"] += 1
+                job["writer"].put(idx, url)
+            elif url in store and not revalidate:
+                job["counts"]["unchanged"] += 1
+            else:
+                queue.append((job, idx, url))
+        job["remaining"] = len(queue)
+        if not queue:
+            job["finished"] = time.monotonic()
+        if job["counts"]["cached"]:
+            print(f"\n{job.get('label', '')}从断点恢复：已跳过 {job['counts']['cached']} 个已完成章节")
+        queues.append(queue)
+    tasks = [task for group in itertools.zip_longest(*queues) for task in group if task is not None]
+    task_of_url = {url: (job, idx) for job, idx, url in tasks}
+    
+    total = sum(len(job["episode_urls"]) for job in jobs)
+    progress_bar = tqdm(total=total, initial=total - len(tasks),
+                        desc="\n增量更新" if update else "\n并发爬取", unit="章")
+    
+    def handle(url, response):
+        store = task_of_url[url][0]["store"]
+        known = url in store
+        if response.status_code == 304:
+            return "unchanged", None
+        with metrics.timer(url, "parse"):
+            content, next_url = parse_chapter(response.text)
+        if known and store.is_same(url, content, next_url):
+            store.update_validators(url, response)
+            return "unchanged", None
+        store.append(url, content, next_url, response)
+        return ("changed" if known else "new"), content
+    
+    def on_done(pos, result, error):
+        job, idx, url = tasks[pos]
+        status, content = result if error is None else ("failed", None)
+        if error is not None:
+            print(f"\n{job.get('label', '')}章节{'更新' if update else '解析'}失败: {url} | 错误: {error}")
+        job["counts"][status] += 1
+        if status != "failed":
+            metrics.count("chapters")
+        if not update:
+            # 正文已落盘到断点存储，按目录下标交给重排缓冲区，保证输出顺序与原顺序一致；
+            # 乱序到达的章节只暂存URL，轮到时再从断点存储读取
+            with metrics.timer(url, "write"):
+                job["writer"].put(idx, url, content)
+        job["remaining"] -= 1
+        if not job["remaining"]:
+            job["finished"] = time.monotonic()
+        progress_bar.update(1)
+    
+    def headers_for(url):
+        store = task_of_url[url][0]["store"]
+        return store.validators(url) if url in store else None
+    
+    fetch_many([url for _, _, url in tasks], handle, workers, engine, on_done, headers_for)
+    progress_bar.close()
     
-    # 06. 输出文件[[221]][[222]]
-    if chapters:
-        filename = f"novel_{novel_id}.txt"
-        with open(filename, 'w', encoding='utf-8') as f:
-            f.write("\n\n".join(chapters))
+    for job in jobs:
+        counts = job["counts"]
+        if update:
+            print(f"\n{job.get('label', '')}更新完成：新增 {counts['new']} 章，变更 {counts['changed']} 章，"
+                  f"未变化 {counts['unchanged']} 章，失败 {counts['failed']} 章")
+            # 按目录顺序从本地缓存重建全文
+            for idx, url in enumerate(job["episode_urls"]):
+                job["writer"].put(idx, url)
+        elif counts["failed"]:
+            print(f"\n{job.get('label', '')}{counts['failed']} 个章节爬取失败，重新运行即可只补爬缺失章节")
+
+def store_text(store, url):
+    """读取已保存的章节正文，缺失章节返回空字符串"""
+    return store.read(url) if url in store else ""
+
+def open_store(novel_id, restart=False):
+    """打开作品的断点存储：同一小说编号重复运行时从第一个缺失章节继续"""
+    store_dir = f"novel_{novel_id}_cache"
+    if restart and os.path.exists(os.path.join(store_dir, "chapters.jsonl")):
+        os.remove(os.path.join(store_dir, "chapters.jsonl"))
+    return ChapterStore(store_dir)
+
+def parse_work_page(html, novel_id):
+    """解析作品主页，返回 (第一章链接, 完整目录)"""
+    soup = BeautifulSoup(html, 'html.parser')
+    first_chapter_tag = soup.select_one('.Layout_layout__5aFuw.Layout_items-normal__4mOqD.Layout_justify-normal__zqNe7.Layout_direction-row__boh0Z.Layout_wrap-wrap__yY3zM.Layout_gap-2s__xUCm0 a')
+    first_url = BASE_URL + first_chapter_tag['href'] if first_chapter_tag else None
+    return first_url, get_episode_urls(html, novel_id)
+
+def read_novel_ids(args):
+    """汇总命令行与批量文件中的小说编号（批量文件每行一个，# 开头为注释），保持顺序去重"""
+    novel_ids = list(args.novel_id)
+    if args.batch:
+        with open(args.batch, 'r', encoding='utf-8') as f:
+            for line in f:
+                line = line.split('#', 1)[0].strip()
+                if line:
+                    novel_ids.append(line)
+    return list(dict.fromkeys(novel_ids))
+
+def crawl_single(novel_id, args):
+    """单部作品爬取"""
+    base_url = f"{BASE_URL}/works/{novel_id}"
+    store = open_store(novel_id, args.restart)
+    
+    # 02. 获取第一章节链接及完整目录[[97]][[102]]
+    try:
+        response = fetch(base_url)
+        next_url, episode_urls = parse_work_page(response.text, novel_id)
+        if args.mode == "serial" and not args.update:
+            episode_urls = []
+        
+        if not next_url and not episode_urls:
+            print("\n错误：未找到章节链接")
+            return
+    except Exception as e:
+        print(f"\n主页解析失败: {e}")
+        return
+    
+    # 03-06. 爬取所有章节并流式写出[[97]][[102]][[106]][[221]][[222]]
+    filename = f"novel_{novel_id}.txt"
+    writer = OrderedWriter(filename, functools.partial(store_text, store), args.fsync)
+    try:
+        if episode_urls:
+            print(f"\n目录解析完成，共 {len(episode_urls)} 章")
+            job = {"novel_id": novel_id, "episode_urls": episode_urls, "store": store, "writer": writer}
+            crawl_works([job], args.workers, args.engine, args.update, not args.no_revalidate)
+        else:
+            if args.mode == "concurrent" or args.update:
+                print("\n未能解析目录，改为顺序爬取")
+            crawl_serial(next_url, store, writer)
+    finally:
+        store.save_manifest()
+        chapter_count = writer.close()
+    
+    if chapter_count:
         print(f"\n完成！共爬取{chapter_count}章，已保存至: {filename}")
     else:
         print("\n未爬取到有效内容")
 
+def crawl_batch(novel_ids, args):
+    """批量爬取：先并发获取各作品目录，再把全部章节交给同一个并发池与限速器，最后输出汇总报告"""
+    started = time.monotonic()
+    jobs = [{"novel_id": novel_id, "label": f"[{novel_id}] ", "episode_urls": [], "error": None,
+             "counts": {}, "chapters": 0} for novel_id in novel_ids]
+    print(f"\n批量模式：共 {len(jobs)} 部作品，并发上限 {args.workers}")
+    
+    def parse_work(url, response):
+        return parse_work_page(response.text, url.rstrip('/').rsplit('/', 1)[1])[1]
+    
+    def on_work_done(idx, episode_urls, error):
+        job = jobs[idx]
+        if error is not None:
+            job["error"] = f"主页解析失败: {error}"
+        elif not episode_urls:
+            job["error"] = "未能解析目录"
+        else:
+            job["episode_urls"] = episode_urls
+    
+    fetch_many([f"{BASE_URL}/works/{job['novel_id']}" for job in jobs], parse_work,
+               args.workers, args.engine, on_work_done)
+    
+    active = [job for job in jobs if not job["error"]]
+    for job in active:
+        job["store"] = open_store(job["novel_id"], args.restart)
+        job["writer"] = OrderedWriter(f"novel_{job['novel_id']}.txt", functools.partial(store_text, job["store"]),
+                                      args.fsync)
+    try:
+        crawl_works(active, args.workers, args.engine, args.update, not args.no_revalidate)
+    finally:
+        for job in active:
+            job["store"].save_manifest()
+            job["chapters"] = job["writer"].close()
+    
+    # 汇总报告：每部作品的耗时、章节数与失败数
+    print("\n批量汇总:")
+    summary = []
+    for job in jobs:
+        if job["error"]:
+            print(f"  {job['novel_id']}: 失败，{job['error']}")
+            summary.append({"novel_id": job["novel_id"], "status": "failed", "error": job["error"]})
+            continue
+        elapsed = job.get("finished", time.monotonic()) - started
+        status = "完成" if not job["counts"]["failed"] else "部分失败"
+        print(f"  {job['novel_id']}: {status}，{job['chapters']} 章，失败 {job['counts']['failed']} 章，耗时 {elapsed:.1f} 秒")
+        summary.append({"novel_id": job["novel_id"], "status": "ok" if not job["counts"]["failed"] else "partial",
+                        "chapters": job["chapters"], "seconds": round(elapsed, 3), **job["counts"]})
+    metrics.extra["works"] = summary
+    failed_works = sum(1 for job in jobs if job["error"] or job["counts"]["failed"])
+    print(f"\n批量完成：{len(jobs)} 部作品，{failed_works} 部存在失败，总耗时 {time.monotonic() - started:.1f} 秒")
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="kakuyomu小说爬虫")
+    parser.add_argument("novel_id", nargs="*", help="小说编号（可填多个进入批量模式），省略时交互输入")
+    parser.add_argument("--batch", help="批量模式：从文件读取小说编号，每行一个")
+    parser.add_argument("--base-url", default=BASE_URL, help="站点根地址（可指向本地模拟服务器用于测试与基准）")
+    parser.add_argument("--mode", choices=["serial", "concurrent"], default="serial",
+                        help="serial: 沿下一话链接顺序爬取；concurrent: 解析目录后并发爬取")
+    parser.add_argument("--workers", type=int, default=4, help="并发模式的最大并发请求数")
+    parser.add_argument("--engine", choices=["thread", "async"], default="thread",
+                        help="并发抓取引擎：thread 为线程池，async 为 asyncio + aiohttp")
+    parser.add_argument("--parser", choices=["auto", "lxml", "bs4"], default="auto",
+                        help="章节解析后端：auto 在安装了 lxml 时使用 lxml，否则使用 BeautifulSoup")
+    parser.add_argument("--interval", type=float, default=1.5,
+                        help="同一主机两次请求的最小间隔（秒），即自适应限速的速率上限")
+    parser.add_argument("--fsync", choices=["none", "chapter", "end"], default="end",
+                        help="输出文件落盘策略：none 不强制、chapter 每章、end 结束时一次")
+    parser.add_argument("--restart", action="store_true", help="忽略已有断点，从头重新爬取")
+    parser.add_argument("--update", action="store_true",
+                        help="增量更新已下载的作品：只下载新增或变化的章节，再从本地缓存重建全文")
+    parser.add_argument("--no-revalidate", action="store_true",
+                        help="增量更新时不再校验已有章节，只下载新增章节")
+    parser.add_argument("--report", help="运行结束后把指标报告（各阶段耗时、计数、逐URL明细）写入该JSON文件")
+    parser.add_argument("--log-interval", type=float, default=0, help="每隔多少秒输出一行指标日志（0为关闭）")
+    parser.add_argument("--metrics-port", type=int, default=0, help="在该端口提供实时指标JSON（0为关闭）")
+    add_fetch_arguments(parser)
+    return parser.parse_args()
+
+def main():
+    """主爬虫程序"""
+    global PARSER_BACKEND, BASE_URL
+    args = parse_args()
+    BASE_URL = args.base_url.rstrip('/')
+    if args.parser == "lxml" and lxml_html is None:
+        print("\n错误：未安装 lxml，请执行 pip install lxml 或改用 --parser bs4")
+        return
+    PARSER_BACKEND = args.parser
+    # 添加延迟避免封IP[[68]][[72]]
+    scrape_fetch.configure(args)
+    
+    if args.log_interval > 0:
+        metrics.start_logging(args.log_interval)
+    if args.metrics_port:
+        metrics.serve(args.metrics_port)
+        print(f"\n实时指标: http://127.0.0.1:{args.metrics_port}/")
+    
+    # 01. 获取小说编号[[41]][[46]]
+    novel_ids = read_novel_ids(args) or [input("请输入小说编号（如1177354054889466403）: ")]
+    try:
+        if len(novel_ids) == 1 and not args.batch:
+            crawl_single(novel_ids[0], args)
+        else:
+            crawl_batch(novel_ids, args)
+    finally:
+        if args.report:
+            metrics.write_report(args.report)
+            print(f"\n运行报告已保存至: {args.report}")
+
 if __name__ == "__main__":
     main()
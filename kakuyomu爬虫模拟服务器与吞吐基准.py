@@ -0,0 +1,228 @@
+import os
+import re
+import sys
+import json
+import time
+import random
+import argparse
+import tempfile
+import threading
+import subprocess
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+CRAWLER_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "kakuyomu小说爬虫系统.py")
+FIRST_CHAPTER_CLASS = "Layout_layout__5aFuw Layout_items-normal__4mOqD Layout_justify-normal__zqNe7 Layout_direction-row__boh0Z Layout_wrap-wrap__yY3zM Layout_gap-2s__xUCm0"
+WORK_ID_BASE = 1177354054880000000
+
+class MockKakuyomu:
+    """本地模拟 kakuyomu 站点：生成合成作品，按配置注入延迟、抖动与错误，并统计每个请求"""
+    def __init__(self, works=1, episodes=100, paragraphs=60, latency=0.05, jitter=0.02,
+                 error_rate=0.0, seed=0):
+        self.work_ids = [str(WORK_ID_BASE + i) for i in range(1, works + 1)]
+        self.episodes = episodes
+        self.paragraphs = paragraphs
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+        self.stats = []
+
+    def episode_id(self, work_id, number):
+        return f"{self.work_ids.index(work_id) + 1}{number:06d}"
+
+    def work_page(self, work_id):
+        """作品主页：第一章链接 + __NEXT_DATA__ 目录"""
+        episode_refs = [{"__ref": f"Episode:{self.episode_id(work_id, n)}"} for n in range(1, self.episodes + 1)]
+        state = {
+            f"Work:{work_id}": {"tableOfContents": [{"__ref": f"TableOfContentsChapter:{work_id}"}]},
+            f"TableOfContentsChapter:{work_id}": {"episodeUnions": episode_refs},
+        }
+        next_data = json.dumps({"props": {"pageProps": {"__APOLLO_STATE__": state}}})
+        first_href = f"/works/{work_id}/episodes/{self.episode_id(work_id, 1)}"
+        return (f'<!DOCTYPE html><html><head><title>{work_id}</title></head><body>'
+                f'<div class="{FIRST_CHAPTER_CLASS}"><a href="{first_href}">第1話</a></div>'
+                f'<script id="__NEXT_DATA__" type="application/json">{next_data}</script></body></html>')
+
+    def episode_page(self, work_id, number):
+        """章节页：与 parse_chapter 的正文和下一话选择器依赖的结构一致"""
+        body = "\n".join(
+            f'<p id="p{i}">合成本文{number}の{i}行目です。<ruby><rb>漢字</rb><rp>（</rp><rt>かんじ</rt><rp>）</rp></ruby>を含みます。</p>'
+            if i % 5 else f'<p id="p{i}" class="blank"><br /></p>'
+            for i in range(1, self.paragraphs + 1))
+        next_link = ""
+        if number < self.episodes:
+            next_href = f"/works/{work_id}/episodes/{self.episode_id(work_id, number + 1)}"
+            next_link = f'<div id="contentMain-nextEpisode"><a href="{next_href}">次へ</a></div>'
+        return (f'<!DOCTYPE html><html><head><title>{number}</title></head><body>'
+                f'<p class="chapterTitle level1 js-vertical-composition-item"><span>第一章</span></p>'
+                f'<p class="widget-episodeTitle js-vertical-composition-item">第{number}話</p>'
+                f'<div class="widget-episodeBody js-episode-body">\n{body}\n</div>{next_link}</body></html>')
+
+    def route(self, path):
+        """返回 (状态码, 页面)"""
+        match = re.match(r'^/works/(\d+)(?:/episodes/(\d+))?/?$', path)
+        if not match or match.group(1) not in self.work_ids:
+            return 404, "not found"
+        work_id, episode = match.groups()
+        if episode is None:
+            return 200, self.work_page(work_id)
+        prefix = str(self.work_ids.index(work_id) + 1)
+        number = int(episode[len(prefix):]) if episode.startswith(prefix) else 0
+        if not 1 <= number <= self.episodes:
+            return 404, "not found"
+        return 200, self.episode_page(work_id, number)
+
+    def handler(self):
+        mock = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, *args):
+                pass
+
+            def do_GET(self):
+                start = time.monotonic()
+                with mock.lock:
+                    delay = max(0.0, mock.latency + mock.random.uniform(-mock.jitter, mock.jitter))
+                    failing = mock.random.random() < mock.error_rate
+                time.sleep(delay)
+                status, page = (503, "unavailable") if failing else mock.route(self.path)
+                data = page.encode('utf-8')
+                self.send_response(status)
+                self.send_header("Content-Type", "text/html; charset=utf-8")
+                self.send_header("Content-Length", str(len(data)))
+                if failing:
+                    self.send_header("Retry-After", "0")
+                self.end_headers()
+                self.wfile.write(data)
+                with mock.lock:
+                    mock.stats.append((time.monotonic() - start, len(data), status))
+
+        return Handler
+
+    def start(self, port=0):
+        """在后台线程启动服务器，返回根地址"""
+        self.server = ThreadingHTTPServer(("127.0.0.1", port), self.handler())
+        self.server.daemon_threads = True
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        return f"http://127.0.0.1:{self.server.server_address[1]}"
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def reset_stats(self):
+        with self.lock:
+            self.stats = []
+
+def percentile(values, q):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(q * (len(ordered) - 1))))]
+
+def count_chapters(path):
+    """统计输出文件中的章节标题数，用于校验爬取结果完整"""
+    if not os.path.exists(path):
+        return 0
+    with open(path, 'r', encoding='utf-8') as f:
+        return len(re.findall(r'^第\d+話$', f.read(), re.M))
+
+MODES = {
+    "serial": ["--mode", "serial"],
+    "concurrent": ["--mode", "concurrent", "--engine", "thread"],
+    "async": ["--mode", "concurrent", "--engine", "async"],
+}
+
+def run_mode(mock, base_url, mode, args):
+    """在临时目录中以子进程运行爬虫，返回该模式的基准结果"""
+    mock.reset_stats()
+    extra = ["--base-url", base_url, "--interval", str(args.interval), "--workers", str(args.workers),
+             "--parser", args.parser, "--fsync", "none"] + MODES[mode]
+    # 顺序模式不支持批量，多部作品时逐部运行
+    commands = ([[work_id] for work_id in mock.work_ids] if mode == "serial" else [mock.work_ids])
+    with tempfile.TemporaryDirectory() as workdir:
+        start = time.monotonic()
+        for work_ids in commands:
+            subprocess.run([sys.executable, CRAWLER_PATH, *work_ids, *extra], cwd=workdir,
+                           stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, check=False)
+        elapsed = time.monotonic() - start
+        chapters = sum(count_chapters(os.path.join(workdir, f"novel_{work_id}.txt")) for work_id in mock.work_ids)
+    with mock.lock:
+        stats = list(mock.stats)
+    latencies = [latency for latency, _, _ in stats]
+    return {
+        "mode": mode,
+        "chapters": chapters,
+        "expected": len(mock.work_ids) * mock.episodes,
+        "seconds": round(elapsed, 3),
+        "chapters_per_second": round(chapters / elapsed, 2) if elapsed else 0.0,
+        "requests": len(stats),
+        "errors": sum(1 for _, _, status in stats if status >= 400),
+        "bytes": sum(size for _, size, _ in stats),
+        "p50_ms": round(percentile(latencies, 0.50) * 1000, 1),
+        "p99_ms": round(percentile(latencies, 0.99) * 1000, 1),
+    }
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="kakuyomu 爬虫本地模拟服务器与吞吐基准")
+    parser.add_argument("--works", type=int, default=1, help="合成作品数")
+    parser.add_argument("--episodes", type=int, default=100, help="每部作品的章节数")
+    parser.add_argument("--paragraphs", type=int, default=60, help="每章段落数")
+    parser.add_argument("--latency", type=float, default=0.05, help="服务器平均响应延迟（秒）")
+    parser.add_argument("--jitter", type=float, default=0.02, help="延迟抖动幅度（秒）")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="返回503的概率")
+    parser.add_argument("--seed", type=int, default=0, help="随机种子")
+    parser.add_argument("--modes", default="serial,concurrent,async", help="要测量的爬虫模式，逗号分隔")
+    parser.add_argument("--workers", type=int, default=8, help="并发模式的最大并发请求数")
+    parser.add_argument("--interval", type=float, default=0.0, help="爬虫的主机限速间隔（秒）")
+    parser.add_argument("--parser", choices=["auto", "lxml", "bs4"], default="auto", help="爬虫的解析后端")
+    parser.add_argument("--json", help="把基准结果另存为JSON文件")
+    parser.add_argument("--serve", action="store_true", help="只启动模拟服务器，不运行基准")
+    parser.add_argument("--port", type=int, default=0, help="--serve 模式的监听端口")
+    return parser.parse_args()
+
+def main():
+    args = parse_args()
+    mock = MockKakuyomu(args.works, args.episodes, args.paragraphs, args.latency, args.jitter,
+                        args.error_rate, args.seed)
+    base_url = mock.start(args.port)
+
+    if args.serve:
+        print(f"模拟服务器已启动: {base_url}")
+        print(f"作品编号: {', '.join(mock.work_ids)}")
+        try:
+            while True:
+                time.sleep(3600)
+        except KeyboardInterrupt:
+            mock.stop()
+        return
+
+    print(f"模拟服务器: {base_url}，{args.works} 部作品 × {args.episodes} 章，"
+          f"延迟 {args.latency * 1000:.0f}±{args.jitter * 1000:.0f}ms，错误率 {args.error_rate:.1%}")
+    results = []
+    for mode in [m.strip() for m in args.modes.split(",") if m.strip()]:
+        if mode not in MODES:
+            print(f"\n[跳过] 未知模式: {mode}")
+            continue
+        print(f"\n[进度] 正在测量 {mode} 模式...")
+        result = run_mode(mock, base_url, mode, args)
+        if result["chapters"] != result["expected"]:
+            print(f"[警告] {mode} 模式只得到 {result['chapters']}/{result['expected']} 章")
+        results.append(result)
+    mock.stop()
+
+    print(f"\n{'模式':<12}{'章节':>8}{'耗时(s)':>10}{'章/秒':>10}{'请求':>8}{'错误':>6}{'p50(ms)':>10}{'p99(ms)':>10}{'字节':>12}")
+    for r in results:
+        print(f"{r['mode']:<12}{r['chapters']:>8}{r['seconds']:>10.2f}{r['chapters_per_second']:>10.2f}"
+              f"{r['requests']:>8}{r['errors']:>6}{r['p50_ms']:>10.1f}{r['p99_ms']:>10.1f}{r['bytes']:>12}")
+
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump({"config": vars(args), "results": results}, f, ensure_ascii=False, indent=2)
+        print(f"\n基准结果已保存至: {args.json}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,505 @@
+"""爬虫共享抓取层：连接池会话、磁盘响应缓存、自适应限速、线程/asyncio 批量抓取引擎与抓取指标，
+kakuyomu 爬虫与元素周期表采集脚本共用"""
+import os
+import json
+import time
+import asyncio
+import hashlib
+import threading
+import contextlib
+import requests
+from requests.adapters import HTTPAdapter
+from requests.structures import CaseInsensitiveDict
+from urllib3.util.retry import Retry
+from urllib.parse import urlparse
+from email.utils import parsedate_to_datetime
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from tqdm import tqdm
+
+try:
+    import aiohttp
+except ImportError:
+    aiohttp = None
+
+HTTP_TIMEOUT = 10
+HTTP_RETRIES = 3
+HTTP_BACKOFF = 0.5
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+# 未设置速率上限（interval 为 0）时限速器的最低速率与回升步长（请求/秒）
+UNBOUNDED_MIN_RATE = 2.0
+session = None
+limiter = None
+cache = None
+
+class CrawlMetrics:
+    """抓取指标：按URL记录各阶段耗时（限速等待/DNS/建连/TTFB/下载/解析/写入），
+    并累计请求数、字节数、重试、缓存命中与错误；可输出JSON报告、周期日志行或HTTP端点"""
+    PHASES = ("wait", "dns", "connect", "ttfb", "download", "parse", "write")
+    COUNTERS = ("requests", "bytes", "retries", "cache_hits", "errors", "chapters")
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.started = time.time()
+        self.start_monotonic = time.monotonic()
+        self.counters = dict.fromkeys(self.COUNTERS, 0)
+        self.phase_values = {phase: [] for phase in self.PHASES}
+        self.records = {}
+        self.extra = {}
+
+    def add_phase(self, url, phase, seconds):
+        with self.lock:
+            record = self.records.setdefault(url, {})
+            record[phase] = round(record.get(phase, 0.0) + seconds, 6)
+            self.phase_values[phase].append(seconds)
+
+    def count(self, name, value=1, url=None):
+        with self.lock:
+            self.counters[name] += value
+            if url is not None:
+                record = self.records.setdefault(url, {})
+                record[name] = record.get(name, 0) + value
+
+    @contextlib.contextmanager
+    def timer(self, url, phase):
+        start = time.monotonic()
+        try:
+            yield
+        finally:
+            self.add_phase(url, phase, time.monotonic() - start)
+
+    def snapshot(self):
+        """当前累计指标（不含逐URL明细）"""
+        with self.lock:
+            elapsed = time.monotonic() - self.start_monotonic
+            phases = {}
+            for phase, values in self.phase_values.items():
+                ordered = sorted(values)
+                phases[phase] = {
+                    "count": len(ordered),
+                    "total": round(sum(ordered), 3),
+                    "mean_ms": round(sum(ordered) / len(ordered) * 1000, 1) if ordered else 0.0,
+                    "p50_ms": round(ordered[len(ordered) // 2] * 1000, 1) if ordered else 0.0,
+                    "p99_ms": round(ordered[min(len(ordered) - 1, int(len(ordered) * 0.99))] * 1000, 1) if ordered else 0.0,
+                }
+            snapshot = {"elapsed": round(elapsed, 3), "counters": dict(self.counters), "phases": phases,
+                        "chapters_per_second": round(self.counters["chapters"] / elapsed, 3) if elapsed else 0.0}
+        if limiter is not None:
+            snapshot["rate_limits"] = {host: round(state["rate"], 3) for host, state in limiter.hosts.items()}
+        return snapshot
+
+    def report(self):
+        """完整运行报告：累计指标 + 逐URL明细 + 附加信息"""
+        report = {"started": self.started, **self.snapshot(), **self.extra}
+        with self.lock:
+            report["urls"] = [{"url": url, **record} for url, record in self.records.items()]
+        return report
+
+    def write_report(self, path):
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(self.report(), f, ensure_ascii=False, indent=1)
+
+    def log_line(self):
+        snapshot = self.snapshot()
+        counters, phases = snapshot["counters"], snapshot["phases"]
+        return (f"[指标] {snapshot['elapsed']:.0f}s 章节 {counters['chapters']} ({snapshot['chapters_per_second']:.2f}/s)"
+                f" | 请求 {counters['requests']} 缓存命中 {counters['cache_hits']} 重试 {counters['retries']}"
+                f" 错误 {counters['errors']} | {counters['bytes'] / 1024 / 1024:.1f}MB"
+                f" | TTFB {phases['ttfb']['mean_ms']:.0f}ms 下载 {phases['download']['mean_ms']:.0f}ms"
+                f" 解析 {phases['parse']['mean_ms']:.0f}ms 限速等待 {phases['wait']['total']:.1f}s")
+
+    def start_logging(self, interval):
+        """后台线程每隔 interval 秒输出一行指标"""
+        def loop():
+            while True:
+                time.sleep(interval)
+                tqdm.write(self.log_line())
+        threading.Thread(target=loop, daemon=True).start()
+
+    def serve(self, port):
+        """启动实时指标端点：GET 任意路径返回当前指标JSON"""
+        metrics = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def do_GET(self):
+                data = json.dumps(metrics.snapshot(), ensure_ascii=False).encode('utf-8')
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json; charset=utf-8")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+        server = ThreadingHTTPServer(("127.0.0.1", port), Handler)
+        server.daemon_threads = True
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        return server
+
+metrics = CrawlMetrics()
+
+def create_session(pool_size=10, retries=3, backoff=0.5):
+    """创建共享会话：连接池 + keep-alive，失败时按指数退避重试"""
+    new_session = requests.Session()
+    retry = Retry(total=retries, backoff_factor=backoff,
+                  status_forcelist=RETRY_STATUSES,
+                  allowed_methods=frozenset(["GET", "HEAD"]),
+                  respect_retry_after_header=True)
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retry)
+    new_session.mount("http://", adapter)
+    new_session.mount("https://", adapter)
+    return new_session
+
+def fetch(url, **kwargs):
+    """通过共享会话发起GET请求，复用已建立的TCP/TLS连接；
+    启用响应缓存时优先读缓存，命中缓存不占用限速额度"""
+    global session
+    if cache is not None and (cache.offline or not kwargs.get("headers")):
+        cached = cache.get(url)
+        if cached is not None:
+            metrics.count("cache_hits", url=url)
+            return cached
+        if cache.offline:
+            raise RuntimeError(f"离线模式下缓存未命中: {url}")
+    if session is None:
+        session = create_session()
+    if limiter is not None:
+        with metrics.timer(url, "wait"):
+            limiter.wait(url)
+    kwargs.setdefault("timeout", HTTP_TIMEOUT)
+    # stream=True 使 get() 在收到响应头时返回，从而把首字节时间与正文下载分开计时；
+    # 线程引擎下 DNS 与建连时间包含在 TTFB 内
+    start = time.monotonic()
+    try:
+        response = session.get(url, stream=True, **kwargs)
+        headers_received = time.monotonic()
+        body = response.content
+    except Exception:
+        metrics.count("errors", url=url)
+        raise
+    metrics.add_phase(url, "ttfb", headers_received - start)
+    metrics.add_phase(url, "download", time.monotonic() - headers_received)
+    metrics.count("requests", url=url)
+    metrics.count("bytes", len(body), url=url)
+    # urllib3 在会话内部完成的重试记录在 retries.history 中，每条都是一次失败的请求
+    retry_state = getattr(response.raw, "retries", None)
+    if retry_state is not None and retry_state.history:
+        metrics.count("retries", len(retry_state.history), url=url)
+        metrics.count("requests", len(retry_state.history), url=url)
+        metrics.count("errors", len(retry_state.history), url=url)
+    if limiter is not None:
+        # 被 urllib3 重试掉的 429/503 不会出现在最终状态码中，逐条反馈给限速器，使线程引擎同样会降速
+        if retry_state is not None:
+            for attempt in retry_state.history:
+                if attempt.status is not None:
+                    limiter.feedback(url, None, attempt.status)
+        limiter.feedback(url, response.elapsed.total_seconds(), response.status_code,
+                         parse_retry_after(response.headers.get("Retry-After")))
+    if response.status_code >= 400:
+        metrics.count("errors", url=url)
+    response.raise_for_status()
+    if cache is not None and response.status_code == 200:
+        cache.put(url, response)
+    return response
+
+def build_response(url, status, headers, body, encoding):
+    """把原始响应数据包装成 requests.Response，供缓存回放与异步引擎复用同一套解析逻辑"""
+    response = requests.Response()
+    response.status_code = status
+    response.headers = CaseInsensitiveDict(headers)
+    response.url = url
+    response.encoding = encoding
+    response._content = body
+    return response
+
+def parse_retry_after(value):
+    """解析 Retry-After 头（秒数或HTTP日期），返回等待秒数"""
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+class RateLimiter:
+    """按主机的自适应令牌桶：速率上限为 1/interval；响应变慢时降速，
+    遇到429/503时减半并按 Retry-After 暂停，恢复正常后逐步回升。
+    interval 为 0 时不设上限，但降速仍从实测请求速率开始，最低降到 UNBOUNDED_MIN_RATE"""
+    def __init__(self, interval, burst=1.0, min_rate=None):
+        self.max_rate = 1.0 / interval if interval > 0 else float("inf")
+        if interval > 0:
+            self.min_rate = min_rate or self.max_rate / 10
+            self.step = self.max_rate * 0.1
+        else:
+            self.min_rate = min_rate or UNBOUNDED_MIN_RATE
+            self.step = self.min_rate
+        self.burst = burst
+        self.lock = threading.Lock()
+        self.hosts = {}
+
+    def _state(self, url):
+        host = urlparse(url).netloc
+        if host not in self.hosts:
+            self.hosts[host] = {"rate": self.max_rate, "tokens": self.burst, "last": None,
+                                "paused_until": 0.0, "latency": None, "best_latency": None, "gap": None}
+        return self.hosts[host]
+
+    def _reserve(self, url):
+        """预留一个令牌，返回需要等待的秒数"""
+        with self.lock:
+            state = self._state(url)
+            now = time.monotonic()
+            elapsed = 0.0
+            if state["last"] is not None:
+                elapsed = now - state["last"]
+                # 请求间隔的滑动平均，不限速时作为降速的起点
+                state["gap"] = elapsed if state["gap"] is None else 0.8 * state["gap"] + 0.2 * elapsed
+            state["last"] = now
+            if state["rate"] == float("inf"):
+                return max(0.0, state["paused_until"] - now)
+            state["tokens"] = min(self.burst, state["tokens"] + elapsed * state["rate"])
+            state["tokens"] -= 1
+            delay = -state["tokens"] / state["rate"] if state["tokens"] < 0 else 0.0
+            return max(delay, state["paused_until"] - now)
+
+    def wait(self, url):
+        """线程模式：阻塞直到获得令牌"""
+        delay = self._reserve(url)
+        if delay > 0:
+            time.sleep(delay)
+
+    async def acquire(self, url):
+        """异步模式：挂起协程直到获得令牌"""
+        delay = self._reserve(url)
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+    def feedback(self, url, latency, status=None, retry_after=None):
+        """根据响应延迟与状态码调整速率（AIMD）"""
+        with self.lock:
+            state = self._state(url)
+            if status in (429, 503) or retry_after:
+                self._slow_down(state, 0.5)
+                if retry_after:
+                    state["paused_until"] = max(state["paused_until"], time.monotonic() + retry_after)
+                return
+            if latency is None:
+                return
+            state["latency"] = latency if state["latency"] is None else 0.8 * state["latency"] + 0.2 * latency
+            state["best_latency"] = latency if state["best_latency"] is None else min(state["best_latency"], latency)
+            if state["latency"] > 2 * state["best_latency"] + 0.05:
+                self._slow_down(state, 0.8)
+            elif state["rate"] < self.max_rate:
+                state["rate"] = min(self.max_rate, state["rate"] + self.step)
+
+    def _slow_down(self, state, factor):
+        """按比例降速；当前不限速时以实测请求速率为基准"""
+        rate = state["rate"]
+        if rate == float("inf"):
+            rate = 1.0 / state["gap"] if state["gap"] else self.min_rate
+        state["rate"] = max(self.min_rate, rate * factor)
+
+async def fetch_async(http, url, headers=None):
+    """异步GET：与 fetch() 相同的缓存/限速语义，429与5xx按 Retry-After 或指数退避重试"""
+    if cache is not None and (cache.offline or not headers):
+        cached = cache.get(url)
+        if cached is not None:
+            metrics.count("cache_hits", url=url)
+            return cached
+        if cache.offline:
+            raise RuntimeError(f"离线模式下缓存未命中: {url}")
+    for attempt in range(HTTP_RETRIES + 1):
+        if attempt:
+            metrics.count("retries", url=url)
+        if limiter is not None:
+            with metrics.timer(url, "wait"):
+                await limiter.acquire(url)
+        start = time.monotonic()
+        # DNS 与建连耗时由 trace_config() 的回调写入 timings
+        timings = {}
+        try:
+            async with http.get(url, headers=headers, trace_request_ctx=timings) as resp:
+                headers_received = time.monotonic()
+                body = await resp.read()
+                response = build_response(url, resp.status, resp.headers, body, resp.charset or "utf-8")
+        except (aiohttp.ClientError, asyncio.TimeoutError):
+            metrics.count("errors", url=url)
+            if attempt == HTTP_RETRIES:
+                raise
+            await asyncio.sleep(HTTP_BACKOFF * 2 ** attempt)
+            continue
+        for phase in ("dns", "connect"):
+            if phase in timings:
+                metrics.add_phase(url, phase, timings[phase])
+        metrics.add_phase(url, "ttfb", headers_received - start - timings.get("dns", 0) - timings.get("connect", 0))
+        metrics.add_phase(url, "download", time.monotonic() - headers_received)
+        metrics.count("requests", url=url)
+        metrics.count("bytes", len(body), url=url)
+        if response.status_code >= 400:
+            metrics.count("errors", url=url)
+        retry_after = parse_retry_after(response.headers.get("Retry-After"))
+        if limiter is not None:
+            limiter.feedback(url, time.monotonic() - start, response.status_code, retry_after)
+        if response.status_code in RETRY_STATUSES and attempt < HTTP_RETRIES:
+            # 有 Retry-After 时限速器已暂停该主机，这里只需补足退避
+            if not retry_after:
+                await asyncio.sleep(HTTP_BACKOFF * 2 ** attempt)
+            continue
+        response.raise_for_status()
+        if cache is not None and response.status_code == 200:
+            cache.put(url, response)
+        return response
+
+def trace_config():
+    """aiohttp 请求追踪：把 DNS 解析与建连耗时写入每个请求的 trace_request_ctx"""
+    def phase_hooks(phase):
+        async def on_start(_, context, __):
+            context.trace_request_ctx[phase + "_start"] = time.monotonic()
+        
+        async def on_end(_, context, __):
+            timings = context.trace_request_ctx
+            timings[phase] = time.monotonic() - timings.pop(phase + "_start", time.monotonic())
+        return on_start, on_end
+    
+    config = aiohttp.TraceConfig()
+    dns_start, dns_end = phase_hooks("dns")
+    connect_start, connect_end = phase_hooks("connect")
+    config.on_dns_resolvehost_start.append(dns_start)
+    config.on_dns_resolvehost_end.append(dns_end)
+    config.on_connection_create_start.append(connect_start)
+    config.on_connection_create_end.append(connect_end)
+    return config
+
+async def _fetch_many_async(urls, handler, workers, on_done, headers_for):
+    connector = aiohttp.TCPConnector(limit=workers, limit_per_host=workers)
+    timeout = aiohttp.ClientTimeout(total=HTTP_TIMEOUT)
+    semaphore = asyncio.Semaphore(workers)
+    async with aiohttp.ClientSession(connector=connector, timeout=timeout, trace_configs=[trace_config()]) as http:
+        async def run(idx, url):
+            async with semaphore:
+                try:
+                    response = await fetch_async(http, url, headers_for(url) if headers_for else None)
+                    # 解析放到线程中执行，避免阻塞事件循环
+                    result = await asyncio.to_thread(handler, url, response)
+                except Exception as e:
+                    on_done(idx, None, e)
+                else:
+                    on_done(idx, result, None)
+        await asyncio.gather(*(run(idx, url) for idx, url in enumerate(urls)))
+
+def fetch_many(urls, handler, workers, engine="thread", on_done=None, headers_for=None):
+    """批量抓取引擎：thread 为线程池 + requests 会话，async 为 asyncio + aiohttp；
+    每个完成的请求调用 handler(url, response)，结果（或异常）通过 on_done(下标, 结果, 异常) 回调到调用线程"""
+    if engine == "async":
+        if aiohttp is None:
+            raise RuntimeError("异步引擎需要安装 aiohttp：pip install aiohttp")
+        asyncio.run(_fetch_many_async(urls, handler, workers, on_done, headers_for))
+        return
+    
+    def run(url):
+        return handler(url, fetch(url, headers=headers_for(url) if headers_for else None))
+    
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = {executor.submit(run, url): idx for idx, url in enumerate(urls)}
+        for future in as_completed(futures):
+            try:
+                result = future.result()
+            except Exception as e:
+                on_done(futures[future], None, e)
+            else:
+                on_done(futures[future], result, None)
+
+class ResponseCache:
+    """磁盘HTTP响应缓存：按URL哈希寻址，带TTL、总大小上限与LRU淘汰；offline=True 时只回放缓存"""
+    def __init__(self, directory, ttl=86400, max_size=500 * 1024 * 1024, offline=False):
+        self.directory = directory
+        self.ttl = ttl
+        self.max_size = max_size
+        self.offline = offline
+        self.lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+        self.total = sum(size for _, size, _ in self._entries())
+
+    def _entries(self):
+        """列出全部缓存文件 (最近访问时间, 大小, 路径)"""
+        entries = []
+        for root, _, files in os.walk(self.directory):
+            for name in files:
+                if name.endswith(".cache"):
+                    path = os.path.join(root, name)
+                    stat = os.stat(path)
+                    entries.append((stat.st_mtime, stat.st_size, path))
+        return entries
+
+    def _path(self, url):
+        key = hashlib.sha256(url.encode('utf-8')).hexdigest()
+        return os.path.join(self.directory, key[:2], key + ".cache")
+
+    def get(self, url):
+        """读取缓存响应；未命中或已过期返回None（离线模式忽略TTL）"""
+        path = self._path(url)
+        try:
+            with open(path, 'rb') as f:
+                meta = json.loads(f.readline())
+                body = f.read()
+        except (OSError, ValueError):
+            return None
+        if not self.offline and time.time() - meta["time"] > self.ttl:
+            return None
+        # 更新访问时间，作为LRU淘汰依据
+        os.utime(path, None)
+        response = build_response(meta["url"], meta["status"], meta["headers"], body, meta["encoding"])
+        response.from_cache = True
+        return response
+
+    def put(self, url, response):
+        """写入响应（临时文件 + 原子替换），超出总大小上限时淘汰最久未访问的条目"""
+        meta = {"url": url, "status": response.status_code, "headers": dict(response.headers),
+                "encoding": response.encoding, "time": time.time()}
+        data = json.dumps(meta, ensure_ascii=False).encode('utf-8') + b"\n" + response.content
+        path = self._path(url)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        with open(tmp_path, 'wb') as f:
+            f.write(data)
+        with self.lock:
+            if os.path.exists(path):
+                self.total -= os.path.getsize(path)
+            os.replace(tmp_path, path)
+            self.total += len(data)
+            if self.total > self.max_size:
+                self._evict()
+
+    def _evict(self):
+        # 一次淘汰到上限的90%，避免每次写入都重新扫描目录
+        for _, size, path in sorted(self._entries()):
+            if self.total <= self.max_size * 0.9:
+                break
+            os.remove(path)
+            self.total -= size
+
+def add_fetch_arguments(parser):
+    """注册抓取层的命令行参数（连接池、重试、超时与响应缓存）"""
+    parser.add_argument("--pool-size", type=int, default=10, help="HTTP连接池大小")
+    parser.add_argument("--retries", type=int, default=3, help="请求失败时的最大重试次数")
+    parser.add_argument("--backoff", type=float, default=0.5, help="重试退避系数（秒）")
+    parser.add_argument("--timeout", type=float, default=10, help="单次请求超时（秒）")
+    parser.add_argument("--cache", action="store_true", help="启用磁盘HTTP响应缓存")
+    parser.add_argument("--cache-dir", default=".http_cache", help="响应缓存目录")
+    parser.add_argument("--cache-ttl", type=float, default=86400, help="缓存有效期（秒）")
+    parser.add_argument("--cache-max-size", type=float, default=500, help="缓存总大小上限（MB）")
+    parser.add_argument("--offline", action="store_true", help="离线回放：只从缓存读取，不发起网络请求")
+
+def configure(args):
+    """按命令行参数初始化共享会话、超时与重试设置、限速器（速率上限 1/args.interval）和响应缓存"""
+    global session, limiter, cache, HTTP_TIMEOUT, HTTP_RETRIES, HTTP_BACKOFF
+    session = create_session(max(args.pool_size, args.workers), args.retries, args.backoff)
+    HTTP_TIMEOUT, HTTP_RETRIES, HTTP_BACKOFF = args.timeout, args.retries, args.backoff
+    limiter = RateLimiter(args.interval)
+    if args.cache or args.offline:
+        cache = ResponseCache(args.cache_dir, args.cache_ttl, int(args.cache_max_size * 1024 * 1024), args.offline)
@@ -0,0 +1,102 @@
+"""段落打包文件（.segpack）格式：分段工具的 --format pack 输出与HTML合并工具的 --pack 输入共用的读写实现"""
+import os
+import json
+import struct
+import hashlib
+
+PACK_SUFFIX = ".segpack"
+PACK_MAGIC = b"SEGPACK1"
+PACK_VERSION = 1
+PACK_FOOTER = struct.Struct("<QQ8s")  # 索引偏移、索引长度、魔数
+
+class SegmentPackWriter:
+    """把条目顺序写入一个打包文件：
+    文件头魔数 | 条目数据 | JSON索引（条目名、偏移、长度、哈希及附加元数据） | 文件尾（索引偏移、索引长度、魔数）。
+    先写临时文件，close 时再替换正式文件"""
+    def __init__(self, path):
+        self.path = path
+        self.temp_path = path + ".tmp"
+        self.file = open(self.temp_path, 'wb')
+        self.file.write(PACK_MAGIC)
+        self.entries = []
+
+    def add(self, data, name=None):
+        self.entries.append({"name": name, "offset": self.file.tell(), "size": len(data),
+                             "sha256": hashlib.sha256(data).hexdigest()})
+        self.file.write(data)
+
+    def close(self, names=None, metadata=None):
+        """写入索引和文件尾；names 可在全部条目写完后再统一指定"""
+        if names is not None:
+            for entry, name in zip(self.entries, names):
+                entry["name"] = name
+        write_pack_index(self.file, self.file.tell(), self.entries, metadata)
+        self.file.close()
+        os.replace(self.temp_path, self.path)
+
+    def abort(self):
+        self.file.close()
+        os.remove(self.temp_path)
+
+def write_pack_index(f, index_offset, entries, metadata=None):
+    """在 index_offset 处写入索引与文件尾，并截断其后的旧内容"""
+    index = dict(metadata or {}, version=PACK_VERSION, entries=entries)
+    data = json.dumps(index, ensure_ascii=False).encode('utf-8')
+    f.seek(index_offset)
+    f.write(data)
+    f.write(PACK_FOOTER.pack(index_offset, len(data), PACK_MAGIC))
+    f.truncate()
+
+class SegmentPackReader:
+    """打包文件的读取接口：按序号（从0开始）或条目名随机读取单个条目，不需要读入整个文件"""
+    def __init__(self, path):
+        self.path = path
+        self.file = open(path, 'rb')
+        try:
+            self.file.seek(0, os.SEEK_END)
+            size = self.file.tell()
+            if size < len(PACK_MAGIC) + PACK_FOOTER.size:
+                raise ValueError(f"不是有效的段落打包文件: {path}")
+            self.file.seek(size - PACK_FOOTER.size)
+            self.index_offset, index_size, magic = PACK_FOOTER.unpack(self.file.read(PACK_FOOTER.size))
+            self.file.seek(0)
+            if magic != PACK_MAGIC or self.file.read(len(PACK_MAGIC)) != PACK_MAGIC:
+                raise ValueError(f"不是有效的段落打包文件: {path}")
+            self.file.seek(self.index_offset)
+            self.metadata = json.loads(self.file.read(index_size).decode('utf-8'))
+        except BaseException:
+            self.file.close()
+            raise
+        self.entries = self.metadata["entries"]
+        self.positions = {entry["name"]: i for i, entry in enumerate(self.entries)}
+
+    def __len__(self):
+        return len(self.entries)
+
+    def names(self):
+        return [entry["name"] for entry in self.entries]
+
+    def read(self, key):
+        """读取一个条目的原始字节；key 为序号（从0开始）或条目名"""
+        entry = self.entries[self.positions[key] if isinstance(key, str) else key]
+        self.file.seek(entry["offset"])
+        return self.file.read(entry["size"])
+
+    def read_text(self, key, encoding='utf-8'):
+        return self.read(key).decode(encoding)
+
+    def __getitem__(self, index):
+        return self.read(index)
+
+    def __iter__(self):
+        for i, entry in enumerate(self.entries):
+            yield entry["name"], self.read(i)
+
+    def close(self):
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
@@ -0,0 +1,144 @@
+"""HTML合并工具与EPUB转换工具的解析后端兼容性测试：
+同一文档经 lxml 快速路径与 BeautifulSoup(html.parser) 路径提取，结果必须完全相同"""
+import os
+import sys
+import random
+import importlib.util
+
+import pytest
+from bs4 import BeautifulSoup
+
+pytest.importorskip("lxml")
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+import html_block_extract
+FIXTURE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures", "extraction")
+FIXTURES = sorted(os.listdir(FIXTURE_DIR))
+# libxml2 与 html.parser 的解析树不同（省略结束标签、块元素嵌在段落中、CDATA、回车符、NUL、
+# "</ p>"、不带分号的数字引用等），必须退回 BeautifulSoup
+FALLBACK_FIXTURES = ["block_in_p.html", "body_in_comment.html", "bogus_end_tag.html", "cdata_and_script.html",
+                     "crlf.html", "entities.html", "misnested.html", "nul_char.html",
+                     "numeric_ref_no_semicolon.html", "pre_and_table.html", "unclosed_li.html", "unclosed_p.html"]
+# 结构规整的文档走 lxml 快速路径
+FAST_PATH_FIXTURES = ["chapter.xhtml", "clean_chapter.html", "ruby.html"]
+
+def load_script(filename, module_name):
+    """按路径导入仓库根目录下的脚本（文件名不是合法的模块名）"""
+    spec = importlib.util.spec_from_file_location(module_name, os.path.join(ROOT, filename))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+merge_tool = load_script("HTML小说文件合并及提取系统.py", "merge_tool")
+epub_tool = load_script("EPUB 到 TXT 格式转换工具.py", "epub_tool")
+
+def read_fixture(name):
+    with open(os.path.join(FIXTURE_DIR, name), 'rb') as f:
+        return f.read()
+
+def merge_extract(backend, content):
+    merge_tool.set_parser_backend(backend)
+    try:
+        return merge_tool.extract_html(content)
+    finally:
+        merge_tool.set_parser_backend("auto")
+
+def epub_blocks(backend, content):
+    epub_tool.PARSER_BACKEND = backend
+    try:
+        return epub_tool.block_texts(content)
+    finally:
+        epub_tool.PARSER_BACKEND = "auto"
+
+@pytest.mark.parametrize("name", FIXTURES)
+def test_merge_backends_agree(name):
+    # 按字节解码，保留打包文件条目中可能出现的 \r
+    content = read_fixture(name).decode('utf-8')
+    assert merge_extract("lxml", content) == merge_extract("bs4", content)
+
+@pytest.mark.parametrize("name", FIXTURES)
+def test_epub_backends_agree(name):
+    content = read_fixture(name)
+    assert epub_blocks("lxml", content) == epub_blocks("bs4", content)
+
+@pytest.mark.parametrize("name", FALLBACK_FIXTURES)
+def test_ambiguous_markup_falls_back(name):
+    content = read_fixture(name).decode('utf-8')
+    assert not html_block_extract.lxml_compatible(content)
+
+@pytest.mark.parametrize("name", FAST_PATH_FIXTURES)
+def test_well_formed_markup_uses_fast_path(name):
+    content = read_fixture(name).decode('utf-8')
+    assert html_block_extract.lxml_compatible(content)
+
+@pytest.mark.parametrize("name", FAST_PATH_FIXTURES)
+def test_lxml_text_matches_get_text(name):
+    content = read_fixture(name).decode('utf-8')
+    body = html_block_extract.parse_document(content).find('body')
+    # get_text() 默认不含注音与脚本文本
+    text = html_block_extract.lxml_text(body, html_block_extract.RUBY_AND_SCRIPT_TAGS)
+    assert text == BeautifulSoup(content, 'html.parser').body.get_text()
+
+def test_unclosed_paragraphs_nest_like_html_parser():
+    content = read_fixture("unclosed_p.html").decode('utf-8')
+    assert merge_extract("lxml", content) == 'one\ntwo\nthree\n\ntwo\nthree\n\nthree'
+
+def test_body_only_in_comment_has_no_body():
+    assert merge_extract("lxml", read_fixture("body_in_comment.html").decode('utf-8')) is None
+
+def test_blocks_inside_ruby_text_are_kept_empty():
+    blocks = epub_blocks("lxml", read_fixture("ruby.html"))
+    assert ('p', '') in blocks
+    assert ('div', '段後') in blocks
+
+TAGS = ("p p p div span b em i font ruby rt rp rb li ul ol h1 h2 table tr td th br hr img a center section "
+        "dl dt dd pre blockquote sup select option title form label").split()
+TEXTS = ["本文", "text", " ", "\n", "  \n ", "&amp;", "&nbsp;", "&copy", "&#x3042;", "&#150;", "&lt;", "漢字",
+         "a&b", "&hellip;", "\t", "x y", "&copy.x", "&#65", "&", "&notin", "&nbsp", "&#x41b", "&#;", "</ p>",
+         "</>", "a\x00b"]
+
+def random_markup(rng, depth=0):
+    """随机生成标签可能省略结束标签、错误嵌套的HTML片段"""
+    parts = []
+    for _ in range(rng.randint(0, 4)):
+        roll = rng.random()
+        if roll < 0.4 or depth > 4:
+            parts.append(rng.choice(TEXTS))
+        elif roll < 0.45:
+            parts.append("<!-- <p>comment</p> -->")
+        else:
+            tag = rng.choice(TAGS)
+            if tag in ("br", "hr", "img"):
+                parts.append(f"<{tag}>" if rng.random() < 0.7 else f"<{tag}/>")
+                continue
+            close = rng.random()
+            parts.append(f'<{tag} class="c">' + random_markup(rng, depth + 1) + (f"</{tag}>" if close < 0.9 else ""))
+            if close > 0.98:
+                parts.append(f"</{rng.choice(TAGS)}>")
+    return "".join(parts)
+
+@pytest.mark.parametrize("seed", range(5))
+def test_random_documents(seed):
+    rng = random.Random(seed)
+    for _ in range(200):
+        head = rng.choice(["<html><head><title>t</title></head>", "<!DOCTYPE html><html><head><meta charset='utf-8'>",
+                           "", "<html>"])
+        content = (head + rng.choice(["<body>", "<body class='x'>", ""]) + random_markup(rng)
+                   + rng.choice(["</body></html>", "", "</body>"]))
+        assert merge_extract("lxml", content) == merge_extract("bs4", content), content
+        assert epub_blocks("lxml", content.encode('utf-8')) == epub_blocks("bs4", content.encode('utf-8')), content
+
+def test_merge_cache_is_keyed_by_parser(tmp_path):
+    folder = tmp_path / "novel"
+    folder.mkdir()
+    merge_tool.set_parser_backend("lxml")
+    try:
+        cache = merge_tool.MergeCache(str(folder))
+        cache.inputs = {"a.html": {"fingerprint": {"size": 1, "mtime_ns": 1}, "sha256": "0", "result": "no_body"}}
+        cache.save()
+        assert "a.html" in merge_tool.MergeCache(str(folder)).previous
+        merge_tool.set_parser_backend("bs4")
+        assert merge_tool.MergeCache(str(folder)).previous == {}
+    finally:
+        merge_tool.set_parser_backend("auto")
@@ -0,0 +1,52 @@
+"""共享抓取层的限速器测试：不设速率上限（interval 为 0）时仍须响应 429/503 与延迟变化"""
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+scrape_fetch = pytest.importorskip("scrape_fetch")
+
+URL = "http://127.0.0.1/works/1"
+
+def test_unbounded_limiter_slows_down_on_overload():
+    limiter = scrape_fetch.RateLimiter(0)
+    assert limiter.min_rate == scrape_fetch.UNBOUNDED_MIN_RATE
+    assert limiter._reserve(URL) == 0.0
+    limiter.feedback(URL, None, 503)
+    rate = limiter.hosts["127.0.0.1"]["rate"]
+    assert limiter.min_rate <= rate < float("inf")
+    for _ in range(50):
+        limiter.feedback(URL, None, 429)
+    assert limiter.hosts["127.0.0.1"]["rate"] == limiter.min_rate
+
+def test_unbounded_limiter_reacts_to_latency_and_recovers():
+    limiter = scrape_fetch.RateLimiter(0)
+    limiter.feedback(URL, 0.01, 200)
+    for _ in range(5):
+        limiter.feedback(URL, 1.0, 200)
+    slowed = limiter.hosts["127.0.0.1"]["rate"]
+    assert slowed < float("inf")
+    for _ in range(50):
+        limiter.feedback(URL, 0.01, 200)
+    assert limiter.hosts["127.0.0.1"]["rate"] > slowed
+
+def test_unbounded_limiter_starts_from_observed_rate():
+    limiter = scrape_fetch.RateLimiter(0)
+    state = limiter._state(URL)
+    limiter._reserve(URL)
+    state["last"] -= 0.1
+    limiter._reserve(URL)
+    limiter.feedback(URL, None, 503)
+    # 实测约 10 请求/秒，减半后约 5 请求/秒
+    assert 4 < state["rate"] < 5.5
+
+def test_bounded_limiter_keeps_its_range():
+    limiter = scrape_fetch.RateLimiter(0.5)
+    assert (limiter.max_rate, limiter.min_rate) == (2.0, 0.2)
+    for _ in range(20):
+        limiter.feedback(URL, None, 503)
+    assert limiter.hosts["127.0.0.1"]["rate"] == 0.2
+    for _ in range(20):
+        limiter.feedback(URL, 0.01, 200)
+    assert limiter.hosts["127.0.0.1"]["rate"] == 2.0
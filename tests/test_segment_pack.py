@@ -0,0 +1,52 @@
+"""段落打包文件（.segpack）读写测试：分段工具与HTML合并工具共用同一实现"""
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from segment_pack import PACK_SUFFIX, SegmentPackWriter, SegmentPackReader, write_pack_index
+
+def test_round_trip_by_index_and_name(tmp_path):
+    path = str(tmp_path / ("novel" + PACK_SUFFIX))
+    writer = SegmentPackWriter(path)
+    writer.add("第一段".encode('utf-8'), "novel_1.txt")
+    writer.add(b"", "novel_2.txt")
+    writer.add("<p>本文</p>".encode('utf-8'), "0001.html")
+    writer.close(metadata={"source": "novel"})
+    assert not os.path.exists(path + ".tmp")
+    with SegmentPackReader(path) as reader:
+        assert len(reader) == 3
+        assert reader.names() == ["novel_1.txt", "novel_2.txt", "0001.html"]
+        assert reader.read_text(0) == "第一段"
+        assert reader.read("novel_2.txt") == b""
+        assert reader[2] == "<p>本文</p>".encode('utf-8')
+        assert reader.metadata["source"] == "novel"
+        assert [name for name, _ in reader] == reader.names()
+
+def test_names_assigned_on_close_and_index_rewritten(tmp_path):
+    path = str(tmp_path / ("novel" + PACK_SUFFIX))
+    writer = SegmentPackWriter(path)
+    for data in (b"a", b"bb"):
+        writer.add(data)
+    writer.close(["novel_1.txt", "novel_2.txt"], {"manifest": {"version": 1}})
+    with SegmentPackReader(path) as reader:
+        index_offset, entries = reader.index_offset, reader.entries
+    with open(path, 'r+b') as f:
+        write_pack_index(f, index_offset, entries, {"manifest": {"version": 2}})
+    with SegmentPackReader(path) as reader:
+        assert reader.metadata["manifest"] == {"version": 2}
+        assert reader.read("novel_2.txt") == b"bb"
+
+def test_abort_leaves_no_files(tmp_path):
+    path = str(tmp_path / ("novel" + PACK_SUFFIX))
+    writer = SegmentPackWriter(path)
+    writer.add(b"a", "a.txt")
+    writer.abort()
+    assert os.listdir(tmp_path) == []
+
+def test_rejects_other_files(tmp_path):
+    path = tmp_path / ("broken" + PACK_SUFFIX)
+    path.write_bytes(b"not a segment pack at all, just some text")
+    with pytest.raises(ValueError):
+        SegmentPackReader(str(path))
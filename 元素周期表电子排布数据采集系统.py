@@ -1,18 +1,18 @@
 import os
 import re
-import time
-import requests
+import argparse
 import pandas as pd
 from bs4 import BeautifulSoup
 from tqdm import tqdm
+import scrape_fetch
+from scrape_fetch import fetch, fetch_many, add_fetch_arguments
 
 def fetch_main_table():
     """爬取主页面元素数据"""
     print("\n[进度1/4] 开始获取主页面元素周期表数据...")
     url = "https://www.webelements.com/"
     try:
-        response = requests.get(url)
-        response.raise_for_status()
+        response = fetch(url)
         soup = BeautifulSoup(response.content, 'html.parser')
         
         elements_dict = {}
@@ -107,7 +107,21 @@ def get_electron_config(soup):
     
     return config_str.strip()
 
+def parse_args():
+    parser = argparse.ArgumentParser(description="元素周期表电子排布数据采集")
+    parser.add_argument("--workers", type=int, default=1, help="元素详情页的最大并发请求数")
+    parser.add_argument("--engine", choices=["thread", "async"], default="thread",
+                        help="抓取引擎：thread 为线程池，async 为 asyncio + aiohttp")
+    parser.add_argument("--interval", type=float, default=0.5,
+                        help="两次请求的最小间隔（秒），即自适应限速的速率上限")
+    add_fetch_arguments(parser)
+    return parser.parse_args()
+
 def main():
+    args = parse_args()
+    # 礼貌性限速
+    scrape_fetch.configure(args)
+    
     elements = fetch_main_table()
     if not elements:
         print("\n[错误] 无法获取元素列表，程序终止")
@@ -119,27 +133,24 @@ def main():
     element_urls = [base_url.format(element.lower()) for element in elements]
     
     print("\n[进度3/4] 开始爬取元素详情页面...")
-    electron_configs = []
-    
-    for idx, url in enumerate(tqdm(element_urls, desc="\n[进度] 处理元素页面"), 1):
-        try:
-            response = requests.get(url)
-            response.raise_for_status()
-            soup = BeautifulSoup(response.content, 'html.parser')
-            
-            config = get_electron_config(soup)
-            if config:
-                electron_configs.append(config)
-            else:
-                print(f"\n[警告] 元素 {idx} 未找到电子排布")
-                electron_configs.append("N/A")
-            
-            # 礼貌性延迟
-            time.sleep(0.5)
-            
-        except Exception as e:
-            print(f"\n[警告] 元素 {idx} 处理失败: {str(e)}")
-            electron_configs.append("N/A")
+    electron_configs = ["N/A"] * len(element_urls)
+    progress_bar = tqdm(total=len(element_urls), desc="\n[进度] 处理元素页面")
+    
+    def parse_element(url, response):
+        soup = BeautifulSoup(response.content, 'html.parser')
+        return get_electron_config(soup)
+    
+    def on_done(idx, config, error):
+        if error is not None:
+            print(f"\n[警告] 元素 {idx + 1} 处理失败: {str(error)}")
+        elif config:
+            electron_configs[idx] = config
+        else:
+            print(f"\n[警告] 元素 {idx + 1} 未找到电子排布")
+        progress_bar.update(1)
+    
+    fetch_many(element_urls, parse_element, args.workers, args.engine, on_done)
+    progress_bar.close()
     
     # 任务4：保存结果到Excel
     print("\n[进度4/4] 生成结果表格...")
@@ -1,105 +1,672 @@
 import os
+import re
+import mmap
+import codecs
 import glob
+import json
+import time
+import queue
+import hashlib
+import logging
+import argparse
+import multiprocessing
+from functools import lru_cache
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
 from tqdm import tqdm
+from segment_pack import PACK_SUFFIX, SegmentPackWriter, SegmentPackReader, write_pack_index
 
-def process_novel_files():
-    # 获取当前目录下所有txt文件，排除特定文件
-    txt_files = glob.glob("*.txt")
-    exclude_file = "代码大纲-分段関数.txt"  # 注意文件名可能是日文或中文编码
-    files_to_process = [f for f in txt_files if f != exclude_file and not f.startswith("代码大纲-分段")]
-    
-    print(f"找到 {len(files_to_process)} 个需要处理的文件")
+try:
+    import tiktoken
+except ImportError:  # 可选依赖，仅 --measure tokens 需要
+    tiktoken = None
+
+try:
+    from charset_normalizer import from_bytes as detect_charset
+except ImportError:  # 可选依赖，缺失时只依靠BOM、试解码和字符统计判断编码
+    try:
+        import chardet
+    except ImportError:
+        detect_charset = None
+    else:
+        def detect_charset(data):
+            return chardet.detect(data).get("encoding")
+
+MAX_SEGMENT_CHARS = 4500
+TOKEN_CACHE_SIZE = 65536
+PROGRESS_EVERY_LINES = 2000
+PROGRESS_LOG_SECONDS = 5.0
+MANIFEST_NAME = ".segment_manifest.json"
+ENCODING_CANDIDATES = ("utf-8", "shift_jis", "cp932", "euc_jp", "gb18030")
+# 同一编码族：检测器给出 cp932 时，按优先顺序仍先尝试与原来行为一致的 shift_jis
+ENCODING_FAMILY = {"cp932": "shift_jis"}
+BOMS = ((codecs.BOM_UTF8, "utf-8-sig"), (codecs.BOM_UTF16_LE, "utf-16"), (codecs.BOM_UTF16_BE, "utf-16"))
+SNIFF_BYTES = 64 * 1024
+DECODE_CHUNK_SIZE = 1 << 20
+LINE_BREAKS = frozenset("\n\r\x0b\x0c\x1c\x1d\x1e\x85\u2028\u2029")
+HASH_CHUNK_SIZE = 1 << 20
+
+# 句子/段落边界：以这些字符结尾的行之后可以断开
+SENTENCE_END_CHARS = frozenset("。！？!?」』）)…‥")
+# 章节标题与场景分隔行：可以在它们之前断开
+HEADING_PATTERN = re.compile(
+    r'\s*(?:第[0-9０-９一二三四五六七八九十百千零〇]+[章話话部幕節节回巻卷]'
+    r'|序章|終章|终章|間章|幕間|プロローグ|エピローグ'
+    r'|[◇◆□■＊*☆★・]{3,}\s*$)')
+
+logger = logging.getLogger("segmenter")
+
+class TqdmLoggingHandler(logging.Handler):
+    """经 tqdm.write 输出日志，避免打断进度条"""
+    def emit(self, record):
+        try:
+            tqdm.write(self.format(record))
+        except Exception:
+            self.handleError(record)
+
+def setup_logging(quiet=False, verbose=False):
+    """quiet 只输出警告和错误；verbose 额外按时间间隔输出处理进度"""
+    handler = TqdmLoggingHandler()
+    handler.setFormatter(logging.Formatter("%(message)s"))
+    logger.addHandler(handler)
+    logger.setLevel(logging.WARNING if quiet else logging.DEBUG if verbose else logging.INFO)
+    logger.propagate = False
+
+def kana_score(text):
+    """假名占比减去半角片假名占比：日文按正确编码解码时假名多，误用其他编码解码时假名少、半角片假名多"""
+    if not text:
+        return 0.0
+    kana = sum(1 for ch in text if '\u3040' <= ch <= '\u30ff')
+    halfwidth = sum(1 for ch in text if '\uff61' <= ch <= '\uff9f')
+    return (kana - halfwidth) / len(text)
+
+def detected_family(prefix):
+    """可选的编码检测器给出的编码（已规范化并归入编码族），不可用或无法判断时返回 None"""
+    if detect_charset is None:
+        return None
+    try:
+        result = detect_charset(prefix)
+        name = result if isinstance(result, str) or result is None else getattr(result.best(), "encoding", None)
+        name = codecs.lookup(name).name if name else None
+    except (LookupError, TypeError, ValueError):
+        return None
+    return ENCODING_FAMILY.get(name, name)
+
+def sniff_encodings(prefix):
+    """根据文件开头判断候选编码，按可能性排序：
+    有BOM时直接采用；否则用增量解码器试解码开头（末尾不完整的多字节字符不算错误），
+    排除解码失败的编码，再按假名统计、可选检测器结果和默认优先顺序排序"""
+    prefix = bytes(prefix)
+    for bom, encoding in BOMS:
+        if prefix.startswith(bom):
+            return [encoding]
     
-    # 处理每个文件
-    for file_idx, filename in enumerate(files_to_process, 1):
-        print(f"\n处理文件 {file_idx}/{len(files_to_process)}: {filename}")
-        
-        # 检查是否已存在处理后的文件夹
-        output_dir = filename.replace(".txt", "")
-        if os.path.exists(output_dir):
-            print(f"跳过文件 {filename}，输出目录已存在")
-            continue
-            
-        # 创建输出目录
-        os.makedirs(output_dir, exist_ok=True)
-        
-        # 读取文件内容
+    scores = {}
+    for encoding in ENCODING_CANDIDATES:
         try:
-            with open(filename, 'r', encoding='utf-8') as f:
-                content = f.read()
+            text = codecs.getincrementaldecoder(encoding)().decode(prefix, False)
         except UnicodeDecodeError:
-            try:
-                with open(filename, 'r', encoding='shift_jis') as f:
-                    content = f.read()
-            except:
-                print(f"无法读取文件 {filename}，请检查编码")
-                continue
-        
-        # 按行拆分内容
-        lines = content.splitlines()
-        print(f"文件共有 {len(lines)} 行")
-        
-        # 处理分段
-        segments = []
-        current_segment = ""
-        current_count = 0
-        
-        # 使用进度条显示处理进度
-        for i, line in tqdm(enumerate(lines), total=len(lines), desc="处理行"):
-            line_length = len(line)
-            
-            # 如果当前行加上后会超过4500字符，则保存当前段落并开始新段落
-            if current_count + line_length >= 4500:
-                if current_segment:  # 确保当前段落不为空
-                    segments.append(current_segment)
-                    current_segment = line + "\n"  # 开始新段落，包含当前行
-                    current_count = line_length
+            continue
+        scores[encoding] = round(kana_score(text), 3)
+    if len(scores) <= 1:
+        return list(scores)
+    
+    # 假名统计无法区分时才调用较慢的检测器
+    best = max(scores.values())
+    family = None
+    if sum(1 for score in scores.values() if score == best) > 1:
+        family = detected_family(prefix)
+    return sorted(scores, key=lambda encoding: (
+        -scores[encoding],
+        ENCODING_FAMILY.get(encoding, encoding) != family,
+        ENCODING_CANDIDATES.index(encoding)))
+
+class MappedSource:
+    """以 mmap 方式只读映射源文件，整个处理过程只读一次磁盘；空文件映射为空字节串。
+    stat 取自已打开的文件描述符，即使处理期间源文件被替换，也与映射的内容对应"""
+    def __init__(self, filename):
+        self.filename = filename
+        self.stat = None
+    
+    def __enter__(self):
+        self.file = open(self.filename, 'rb')
+        self.stat = os.fstat(self.file.fileno())
+        try:
+            self.data = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            self.data = b''
+        return self.data
+    
+    def __exit__(self, *exc_info):
+        if isinstance(self.data, mmap.mmap):
+            self.data.close()
+        self.file.close()
+
+class DecodedLines:
+    """按块增量解码映射的字节并逐行产出，行的切分规则与 str.splitlines() 一致；
+    position 为已解码的字节数，用于进度汇报"""
+    def __init__(self, data, encoding, chunk_size=DECODE_CHUNK_SIZE):
+        self.data = data
+        self.encoding = encoding
+        self.chunk_size = chunk_size
+        self.position = 0
+    
+    def __iter__(self):
+        decoder = codecs.getincrementaldecoder(self.encoding)()
+        view = memoryview(self.data)
+        size = len(view)
+        pending = ""
+        try:
+            while self.position < size:
+                end = min(self.position + self.chunk_size, size)
+                text = pending + decoder.decode(view[self.position:end], end == size)
+                self.position = end
+                if not text:
+                    continue
+                lines = text.splitlines()
+                if end == size:
+                    pending = ""
+                elif text[-1] == "\r":
+                    # 可能是跨块的 \r\n，留到下一块再切分
+                    pending = lines.pop() + "\r"
+                elif text[-1] not in LINE_BREAKS:
+                    pending = lines.pop()
                 else:
-                    # 如果单行就超过4500字符，直接作为一个段落
-                    segments.append(line)
-                    current_segment = ""
-                    current_count = 0
-            else:
-                # 添加当前行到段落
-                current_segment += line + "\n"
-                current_count += line_length
-            
-            # 每处理100行更新一次进度
-            if i % 100 == 0:
-                print(f"\n已处理 {i}/{len(lines)} 行，当前段落长度: {current_count} 字符")
-        
-        # 添加最后一个段落
-        if current_segment:
-            segments.append(current_segment)
-        
-        print(f"\n文件分割完成，共 {len(segments)} 个段落")
+                    pending = ""
+                yield from lines
+        finally:
+            view.release()
+
+def measure_bytes(line):
+    """UTF-8 字节数，包含行尾换行符，使段落文件大小不超过上限"""
+    return len(line.encode('utf-8')) + 1
+
+@lru_cache(maxsize=None)
+def token_measure(tokenizer):
+    """按分词器计算每行的 token 数；同一进程内复用编码器，重复出现的行（空行、分隔符等）命中缓存"""
+    if tiktoken is None:
+        raise RuntimeError("--measure tokens 需要安装 tiktoken")
+    encoding = tiktoken.get_encoding(tokenizer)
+    
+    @lru_cache(maxsize=TOKEN_CACHE_SIZE)
+    def measure_tokens(line):
+        return len(encoding.encode_ordinary(line))
+    return measure_tokens
+
+def get_measure(settings):
+    """根据设置返回长度函数：chars 字符数，bytes UTF-8 字节数，tokens 分词器 token 数"""
+    if settings["measure"] == "bytes":
+        return measure_bytes
+    if settings["measure"] == "tokens":
+        return token_measure(settings["tokenizer"])
+    return len
+
+def iter_segments(lines, limit=MAX_SEGMENT_CHARS, measure=len):
+    """流式分段：累计长度达到上限时产出当前段落；段落内容先收集到列表，关闭时一次性拼接。
+    每行长度只用 measure 计算一次"""
+    parts = []
+    current_count = 0
+    
+    for line in lines:
+        line_length = measure(line)
         
-        # 确定序号格式
-        total_segments = len(segments)
-        if total_segments < 10:
-            num_format = "{:01d}"
-        elif total_segments < 100:
-            num_format = "{:02d}"
-        elif total_segments < 1000:
-            num_format = "{:03d}"
+        # 如果当前行加上后会超过上限，则保存当前段落并开始新段落
+        if current_count + line_length >= limit:
+            if parts:  # 确保当前段落不为空
+                yield "".join(parts)
+                parts = [line, "\n"]  # 开始新段落，包含当前行
+                current_count = line_length
+            else:
+                # 如果单行就超过4500字符，直接作为一个段落
+                yield line
+                current_count = 0
         else:
-            num_format = "{:04d}"
+            # 添加当前行到段落
+            parts.append(line)
+            parts.append("\n")
+            current_count += line_length
+    
+    # 添加最后一个段落
+    if parts:
+        yield "".join(parts)
+
+def is_heading(line):
+    """章节标题或场景分隔行"""
+    return HEADING_PATTERN.match(line) is not None
+
+def ends_paragraph(line):
+    """空行或以句末符号结尾的行"""
+    stripped = line.rstrip()
+    return not stripped or stripped[-1] in SENTENCE_END_CHARS
+
+def iter_segments_by_boundary(lines, limit=MAX_SEGMENT_CHARS, measure=len):
+    """按句子/段落边界分段：读取时一次性记录候选断点（空行、句末符号结尾的行之后、章节标题之前），
+    段落即将超过上限时在最后一个候选断点处切开（贪心取最大填充），断点之后的行带入下一段；
+    当前段落内没有候选断点时退回按字符数切分"""
+    buffer = []
+    current_count = 0
+    cut_lines = 0  # 最后一个候选断点之前的行数，0 表示没有断点
+    cut_count = 0
+    
+    for line in lines:
+        line_length = measure(line)
+        if buffer and is_heading(line):
+            cut_lines, cut_count = len(buffer), current_count
         
-        print(f"使用序号格式: {num_format.format(1).zfill(len(str(total_segments)))}")
+        while buffer and current_count + line_length >= limit:
+            if not cut_lines:
+                cut_lines, cut_count = len(buffer), current_count
+            yield "\n".join(buffer[:cut_lines]) + "\n"
+            del buffer[:cut_lines]
+            current_count -= cut_count
+            cut_lines = cut_count = 0
         
-        # 保存分段结果
-        for seg_idx, segment in enumerate(tqdm(segments, desc="保存段落"), 1):
-            formatted_idx = num_format.format(seg_idx)
-            output_filename = f"{filename.replace('.txt', '')}_{formatted_idx}.txt"
-            output_path = os.path.join(output_dir, output_filename)
-            
-            with open(output_path, 'w', encoding='utf-8') as f:
-                f.write(segment)
+        if line_length >= limit:
+            # 单行就超过上限，直接作为一个段落
+            yield line + "\n"
+            continue
         
-        print(f"\n文件 {filename} 处理完成，保存到 {output_dir} 目录")
+        buffer.append(line)
+        current_count += line_length
+        if ends_paragraph(line):
+            cut_lines, cut_count = len(buffer), current_count
+    
+    # 添加最后一个段落
+    if buffer:
+        yield "\n".join(buffer) + "\n"
+
+SEGMENTERS = {
+    "chars": iter_segments,
+    "sentence": iter_segments_by_boundary,
+}
+
+MEASURES = ("chars", "bytes", "tokens")
+
+DEFAULT_SETTINGS = {"boundary": "chars", "measure": "chars", "limit": MAX_SEGMENT_CHARS, "tokenizer": "cl100k_base",
+                    "format": "dir"}
+
+def segment_number_format(total_segments):
+    """根据段落总数确定序号格式"""
+    if total_segments < 10:
+        return "{:01d}"
+    elif total_segments < 100:
+        return "{:02d}"
+    elif total_segments < 1000:
+        return "{:03d}"
+    return "{:04d}"
+
+def file_sha256(path):
+    """分块计算文件的 SHA-256"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK_SIZE), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def load_manifest(output_dir):
+    """读取输出目录中的清单，不存在或损坏时返回 None"""
+    try:
+        with open(os.path.join(output_dir, MANIFEST_NAME), 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+def save_manifest(output_dir, manifest):
+    """先写临时文件再替换，避免中断时留下半个清单"""
+    path = os.path.join(output_dir, MANIFEST_NAME)
+    with open(path + ".tmp", 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=2)
+    os.replace(path + ".tmp", path)
+
+def existing_segments(output_dir, base_name, manifest):
+    """已有段落文件名 -> SHA-256：有清单时直接取清单记录，否则（旧版输出）对目录中的段落文件计算哈希"""
+    if manifest is not None:
+        return {seg["name"]: seg["sha256"] for seg in manifest["segments"]}
+    pattern = re.compile(re.escape(os.path.basename(base_name)) + r'_\d+\.txt$')
+    return {name: file_sha256(os.path.join(output_dir, name))
+            for name in os.listdir(output_dir) if pattern.match(name)}
+
+class DirectoryOutput:
+    """默认输出格式：与源文件同名的目录，每个段落一个 .txt 文件，清单单独保存；只改写内容变化的段落"""
+    def __init__(self, filename):
+        self.base_name = filename.replace(".txt", "")
+        self.path = self.base_name
+        self.created = False
+        self.previous = {}
+        self.temp_paths = []
+
+    def exists(self):
+        return os.path.exists(self.path)
+
+    def load_manifest(self):
+        return load_manifest(self.path)
+
+    def refresh_manifest(self, manifest):
+        save_manifest(self.path, manifest)
+
+    def is_complete(self, manifest):
+        return all(os.path.exists(os.path.join(self.path, seg["name"])) for seg in manifest["segments"])
+
+    def begin(self, manifest):
+        self.created = not self.exists()
+        os.makedirs(self.path, exist_ok=True)
+        self.previous = existing_segments(self.path, self.base_name, manifest)
+
+    def add(self, seg_idx, data):
+        temp_path = os.path.join(self.path, f".segment_{seg_idx}.tmp")
+        with open(temp_path, 'wb') as out:
+            out.write(data)
+        self.temp_paths.append(temp_path)
+
+    def discard(self):
+        for temp_path in self.temp_paths:
+            os.remove(temp_path)
+        self.temp_paths = []
+
+    def finish(self, entries, quiet=False):
+        """保存分段结果：内容与已有文件相同的段落保留原文件不动，其余替换；删除不再属于本次结果的旧段落。
+        返回 (更新数, 删除数)"""
+        updated = 0
+        for temp_path, entry in zip(tqdm(self.temp_paths, desc="保存段落", disable=quiet), entries):
+            output_path = os.path.join(self.path, entry["name"])
+            if self.previous.get(entry["name"]) == entry["sha256"] and os.path.exists(output_path):
+                os.remove(temp_path)
+            else:
+                os.replace(temp_path, output_path)
+                updated += 1
+        self.temp_paths = []
+        
+        current_names = {entry["name"] for entry in entries}
+        removed = 0
+        for name in self.previous:
+            if name not in current_names and os.path.exists(os.path.join(self.path, name)):
+                os.remove(os.path.join(self.path, name))
+                removed += 1
+        return updated, removed
+
+    def save_manifest(self, manifest):
+        save_manifest(self.path, manifest)
+
+    def abandon(self):
+        if self.created:
+            os.rmdir(self.path)
+
+class PackOutput:
+    """打包输出格式：所有段落写入一个 .segpack 文件，清单保存在索引中；有变化时整体替换"""
+    def __init__(self, filename):
+        self.base_name = filename.replace(".txt", "")
+        self.path = self.base_name + PACK_SUFFIX
+        self.previous = {}
+        self.writer = None
+        self.names = None
+
+    def exists(self):
+        return os.path.exists(self.path)
+
+    def load_manifest(self):
+        try:
+            with SegmentPackReader(self.path) as reader:
+                return reader.metadata.get("manifest")
+        except (OSError, ValueError, KeyError):
+            return None
+
+    def refresh_manifest(self, manifest):
+        """只重写文件尾部的索引，不复制段落数据"""
+        with SegmentPackReader(self.path) as reader:
+            index_offset, entries = reader.index_offset, reader.entries
+        with open(self.path, 'r+b') as f:
+            write_pack_index(f, index_offset, entries, {"manifest": manifest})
+
+    def is_complete(self, manifest):
+        return True
+
+    def begin(self, manifest):
+        if manifest is not None:
+            self.previous = {seg["name"]: seg["sha256"] for seg in manifest["segments"]}
+        self.writer = SegmentPackWriter(self.path)
+
+    def add(self, seg_idx, data):
+        self.writer.add(data)
+
+    def discard(self):
+        self.writer.abort()
+        self.writer = SegmentPackWriter(self.path)
+
+    def finish(self, entries, quiet=False):
+        """记录段落名，返回与上次结果相比的 (变化段落数, 删除段落数)"""
+        self.names = [entry["name"] for entry in entries]
+        updated = sum(1 for entry in entries if self.previous.get(entry["name"]) != entry["sha256"])
+        removed = len(set(self.previous) - set(self.names))
+        return updated, removed
+
+    def save_manifest(self, manifest):
+        self.writer.close(self.names, {"manifest": manifest})
+        self.writer = None
+
+    def abandon(self):
+        if self.writer is not None:
+            self.writer.abort()
+            self.writer = None
+
+OUTPUT_FORMATS = {
+    "dir": DirectoryOutput,
+    "pack": PackOutput,
+}
+
+def is_up_to_date(filename, output, manifest, settings):
+    """源文件与分段设置都未变化且段落齐全时返回 True；先比较大小和修改时间，变化时再比较内容哈希"""
+    if manifest is None or manifest.get("settings") != settings:
+        return False
+    if not output.is_complete(manifest):
+        return False
+    stat = os.stat(filename)
+    if manifest["source_size"] == stat.st_size and manifest["source_mtime_ns"] == stat.st_mtime_ns:
+        return True
+    if manifest["source_size"] != stat.st_size or manifest["source_sha256"] != file_sha256(filename):
+        return False
+    # 内容相同只是修改时间变了：刷新清单，下次直接按大小和时间跳过
+    manifest["source_mtime_ns"] = stat.st_mtime_ns
+    output.refresh_manifest(manifest)
+    return True
+
+def write_segments(filename, data, output, encoding, settings=DEFAULT_SETTINGS, quiet=False, progress=None):
+    """按给定编码增量解码映射的源文件 data 并分段：每个段落一关闭就交给输出对象暂存并计算哈希，
+    全部完成后按总数确定序号格式并由输出对象提交（只改写内容变化的段落）。
+    返回 (行数, 字符数, 段落数, 耗时秒数, 段落清单, 更新数, 删除数)。
+    progress(字节增量) 用于向汇总进度条报告读取进度"""
+    base_name = os.path.basename(filename.replace('.txt', ''))
+    segment_hashes = []
+    line_count = 0
+    char_count = 0
+    reported = 0
+    start = time.monotonic()
+    log_progress = not quiet and logger.isEnabledFor(logging.DEBUG)
+    last_log = start
+    
+    def counted(lines, reader):
+        nonlocal line_count, char_count, reported, last_log
+        for line in lines:
+            line_count += 1
+            char_count += len(line)
+            if line_count % PROGRESS_EVERY_LINES == 0:
+                if progress is not None:
+                    position = reader.position
+                    progress(position - reported)
+                    reported = position
+                # 详细模式下按时间间隔输出进度，而不是按行数
+                if log_progress and time.monotonic() - last_log >= PROGRESS_LOG_SECONDS:
+                    last_log = time.monotonic()
+                    logger.debug(f"已处理 {line_count} 行，{char_count} 字符，已完成 {len(segment_hashes)} 个段落")
+            yield line
+
+    try:
+        reader = DecodedLines(data, encoding)
+        # 使用进度条显示处理进度
+        lines = counted(tqdm(reader, desc="处理行", unit="行", mininterval=0.5, disable=quiet), reader)
+        segments = SEGMENTERS[settings["boundary"]](lines, settings["limit"], get_measure(settings))
+        for seg_idx, segment in enumerate(segments, 1):
+            # 与文本模式写入的字节一致（含平台换行符），便于和已有文件比较哈希
+            encoded = segment.replace("\n", os.linesep).encode('utf-8')
+            output.add(seg_idx, encoded)
+            segment_hashes.append((hashlib.sha256(encoded).hexdigest(), len(encoded)))
+    except BaseException:
+        output.discard()
+        if progress is not None and reported:
+            progress(-reported)
+        raise
+    if progress is not None:
+        progress(len(data) - reported)
+
+    # 确定序号格式
+    total_segments = len(segment_hashes)
+    num_format = segment_number_format(total_segments)
+    if not quiet:
+        logger.debug(f"使用序号格式: {num_format.format(1).zfill(len(str(total_segments)))}")
+
+    segment_entries = [{"name": f"{base_name}_{num_format.format(seg_idx)}.txt", "sha256": digest, "size": size}
+                       for seg_idx, (digest, size) in enumerate(segment_hashes, 1)]
+    updated, removed = output.finish(segment_entries, quiet)
+
+    return (line_count, char_count, total_segments, time.monotonic() - start,
+            segment_entries, updated, removed)
+
+def format_summary(filename, output_path, line_count, char_count, total_segments, elapsed, updated, removed):
+    """文件处理结束时的汇总：行数、字符数、段落数、更新情况与吞吐量"""
+    elapsed = max(elapsed, 1e-9)
+    return (f"文件 {filename} 处理完成，保存到 {output_path}："
+            f"{line_count} 行，{char_count} 字符，{total_segments} 个段落（更新 {updated} 个，删除旧段落 {removed} 个），"
+            f"用时 {elapsed:.2f} 秒（{line_count / elapsed:,.0f} 行/秒，{char_count / elapsed:,.0f} 字符/秒）")
+
+def segment_file(filename, settings=DEFAULT_SETTINGS, quiet=False, progress=None):
+    """处理单个文件，返回 (日志级别, 结果说明)。
+    清单记录源文件哈希、分段设置和每个段落的哈希：源文件与设置未变时整个跳过，
+    否则重新分段但只改写内容变化的段落"""
+    output = OUTPUT_FORMATS[settings["format"]](filename)
+    manifest = None
+    if output.exists():
+        manifest = output.load_manifest()
+        if is_up_to_date(filename, output, manifest, settings):
+            if progress is not None:
+                progress(os.path.getsize(filename))
+            return logging.INFO, f"跳过文件 {filename}，源文件和分段设置均未变化"
+    
+    output.begin(manifest)
+    
+    # 映射源文件并根据开头判断编码，按候选顺序增量解码分段；极少数情况下后部才出现解码错误时换下一个候选
+    # 清单中的源文件哈希与大小、修改时间都取自这次映射的内容，不再重新打开文件
+    stats = None
+    source = MappedSource(filename)
+    try:
+        with source as data:
+            for encoding in sniff_encodings(data[:SNIFF_BYTES]):
+                try:
+                    stats = write_segments(filename, data, output, encoding, settings, quiet, progress)
+                    break
+                except UnicodeDecodeError:
+                    logger.debug(f"文件 {filename} 按 {encoding} 解码失败，尝试下一个候选编码")
+            if stats is not None:
+                source_sha256 = hashlib.sha256(data).hexdigest()
+    finally:
+        if stats is None:
+            output.abandon()
+    if stats is None:
+        if progress is not None:
+            progress(os.path.getsize(filename))
+        return logging.WARNING, f"无法读取文件 {filename}，请检查编码"
+    
+    line_count, char_count, total_segments, elapsed, segment_entries, updated, removed = stats
+    output.save_manifest({
+        "source": os.path.basename(filename),
+        "source_sha256": source_sha256,
+        "source_size": source.stat.st_size,
+        "source_mtime_ns": source.stat.st_mtime_ns,
+        "encoding": encoding,
+        "settings": settings,
+        "segments": segment_entries,
+    })
+    return logging.INFO, format_summary(filename, output.path, line_count, char_count, total_segments,
+                                        elapsed, updated, removed)
+
+def _segment_file_worker(filename, settings, progress_queue):
+    """进程池入口：静默处理单个文件，读取进度经队列汇报给主进程"""
+    return segment_file(filename, settings, quiet=True, progress=lambda delta: progress_queue.put(delta))
+
+def process_files_parallel(files_to_process, jobs, settings=DEFAULT_SETTINGS, quiet=False):
+    """多进程并行分段：每个文件由一个工作进程处理，主进程汇总所有文件的读取进度到同一个进度条"""
+    total_bytes = sum(os.path.getsize(f) for f in files_to_process)
+    with multiprocessing.Manager() as manager:
+        progress_queue = manager.Queue()
+        progress_bar = tqdm(total=total_bytes, desc=f"并行分段({jobs}进程)", unit="B", unit_scale=True,
+                            mininterval=0.5, disable=quiet)
+        with ProcessPoolExecutor(max_workers=jobs) as executor:
+            futures = {executor.submit(_segment_file_worker, f, settings, progress_queue): f for f in files_to_process}
+            pending = set(futures)
+            while pending:
+                done, pending = wait(pending, timeout=0.2, return_when=FIRST_COMPLETED)
+                while True:
+                    try:
+                        progress_bar.update(progress_queue.get_nowait())
+                    except queue.Empty:
+                        break
+                for future in done:
+                    try:
+                        logger.log(*future.result())
+                    except Exception as e:
+                        logger.error(f"处理文件 {futures[future]} 时出错: {e}")
+        progress_bar.close()
+
+def process_novel_files(jobs=1, settings=DEFAULT_SETTINGS, quiet=False):
+    # 获取当前目录下所有txt文件，排除特定文件
+    txt_files = glob.glob("*.txt")
+    exclude_file = "代码大纲-分段関数.txt"  # 注意文件名可能是日文或中文编码
+    files_to_process = [f for f in txt_files if f != exclude_file and not f.startswith("代码大纲-分段")]
+    
+    logger.info(f"找到 {len(files_to_process)} 个需要处理的文件")
+    
+    if jobs > 1 and len(files_to_process) > 1:
+        process_files_parallel(files_to_process, jobs, settings, quiet)
+        return
+    
+    # 处理每个文件
+    for file_idx, filename in enumerate(files_to_process, 1):
+        logger.info(f"\n处理文件 {file_idx}/{len(files_to_process)}: {filename}")
+        level, message = segment_file(filename, settings, quiet)
+        logger.log(level, f"\n{message}")
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="日文轻小说分段工具")
+    parser.add_argument("--jobs", type=int, default=1,
+                        help="并行处理文件的进程数（0 表示使用全部CPU核心）")
+    parser.add_argument("--boundary", choices=sorted(SEGMENTERS), default="chars",
+                        help="分段边界：chars 严格按字符数切分；sentence 在不超过上限的前提下尽量在句末、空行或章节标题处切开")
+    parser.add_argument("--measure", choices=MEASURES, default="chars",
+                        help="段落长度的计量方式：chars 字符数，bytes UTF-8 字节数，tokens 分词器 token 数（需要 tiktoken）")
+    parser.add_argument("--limit", type=int, default=MAX_SEGMENT_CHARS,
+                        help=f"每个段落的长度上限，单位由 --measure 决定（默认 {MAX_SEGMENT_CHARS}）")
+    parser.add_argument("--tokenizer", default=DEFAULT_SETTINGS["tokenizer"],
+                        help="--measure tokens 使用的 tiktoken 编码名")
+    parser.add_argument("--format", choices=sorted(OUTPUT_FORMATS), default="dir",
+                        help=f"输出格式：dir 每个段落一个文件；pack 所有段落写入一个 {PACK_SUFFIX} 打包文件（带索引，可随机读取）")
+    verbosity = parser.add_mutually_exclusive_group()
+    verbosity.add_argument("-q", "--quiet", action="store_true",
+                           help="安静模式：不显示进度条，只输出警告和错误")
+    verbosity.add_argument("-v", "--verbose", action="store_true",
+                           help=f"详细模式：每 {PROGRESS_LOG_SECONDS:g} 秒输出一次处理进度")
+    args = parser.parse_args()
+    if args.limit <= 0:
+        parser.error("--limit 必须大于 0")
+    if args.measure == "tokens":
+        try:
+            token_measure(args.tokenizer)
+        except Exception as e:
+            parser.error(f"无法加载分词器 {args.tokenizer}: {e}")
+    return args
 
 if __name__ == "__main__":
-    print("日文轻小说分段工具（带智能序号格式化）")
-    print("=" * 60)
-    process_novel_files()
-    print("\n所有文件处理完成！")
+    args = parse_args()
+    setup_logging(args.quiet, args.verbose)
+    logger.info("日文轻小说分段工具（带智能序号格式化）")
+    logger.info("=" * 60)
+    settings = {"boundary": args.boundary, "measure": args.measure, "limit": args.limit, "tokenizer": args.tokenizer,
+                "format": args.format}
+    process_novel_files(args.jobs or os.cpu_count(), settings, args.quiet)
+    logger.info("\n所有文件处理完成！")